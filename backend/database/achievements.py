@@ -0,0 +1,171 @@
+"""
+Event-driven badge engine.
+
+Each rule is indexed by the event kinds it listens to, so an event only wakes
+the rules that care about it. Rules that need memory (counts, streaks) keep a
+small per-user state row in `achievement_progress` that is updated as events
+arrive; nothing ever rescans a user's history. Evaluation runs inside the
+caller's transaction and returns the new awards; announcing them after commit
+is the caller's job (routers.ws.announce_awards publishes them to every worker).
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import upsert_insert
+from .models import AchievementProgress, UserBadge
+
+# Event kinds
+XP = "xp"                          # {"xp": new total}
+WORLD_COMPLETED = "world_completed"  # {"world_id": ...}, first completion only
+MISTAKE = "mistake"                # {"topic": ...}
+PROMPT_SCORED = "prompt_scored"    # {"score": ..., "grade": ...}
+
+BADGES = [
+    {"id": "ai_explorer", "name": "AI Explorer", "description": "Completed World 1", "icon": "🔍", "world": 1},
+    {"id": "prediction_pro", "name": "Prediction Pro", "description": "Completed World 2", "icon": "📊", "world": 2},
+    {"id": "token_master", "name": "Token Master", "description": "Completed World 3", "icon": "🔤", "world": 3},
+    {"id": "prompt_master", "name": "Prompt Master", "description": "Completed World 4", "icon": "✍️", "world": 4},
+    {"id": "truth_seeker", "name": "Truth Seeker", "description": "Completed World 5", "icon": "🕵️", "world": 5},
+    {"id": "ai_trainer", "name": "AI Trainer", "description": "Completed World 6", "icon": "🏋️", "world": 6},
+    {"id": "context_wizard", "name": "Context Wizard", "description": "Completed World 7", "icon": "🧠", "world": 7},
+    {"id": "world_traveler", "name": "World Traveler", "description": "Completed 3 worlds", "icon": "🧭"},
+    {"id": "rising_star", "name": "Rising Star", "description": "Reached level 5 (700 XP)", "icon": "⭐"},
+    {"id": "first_prompt", "name": "First Prompt", "description": "Scored your first prompt", "icon": "📝"},
+    {"id": "prompt_perfectionist", "name": "Prompt Perfectionist", "description": "Scored 90+ on a prompt", "icon": "💯"},
+    {"id": "on_a_roll", "name": "On a Roll", "description": "Five prompts in a row scoring 70+", "icon": "🔥"},
+    {"id": "learning_from_mistakes", "name": "Learning from Mistakes", "description": "Made 10 mistakes", "icon": "📚"},
+]
+BADGES_BY_ID = {badge["id"]: badge for badge in BADGES}
+
+
+@dataclass(frozen=True)
+class AchievementEvent:
+    user_id: int
+    kind: str
+    data: dict
+
+
+@dataclass(frozen=True)
+class Rule:
+    badge_id: str
+    events: tuple
+    # (state, event) -> True once earned; stateful rules update `state` in place
+    check: Callable
+    goal: Optional[int] = None  # target for state["count"], shown as progress
+
+
+def _counter(goal: int, matches: Callable = lambda event: True, streak: bool = False) -> Callable:
+    """Count matching events; a streak resets on any event that doesn't match."""
+    def check(state: dict, event: AchievementEvent) -> bool:
+        if matches(event):
+            state["count"] = state.get("count", 0) + 1
+        elif streak:
+            state["count"] = 0
+        return state.get("count", 0) >= goal
+    return check
+
+
+RULES = [
+    *(Rule(b["id"], (WORLD_COMPLETED,), lambda s, e, world=b["world"]: e.data["world_id"] == world)
+      for b in BADGES if "world" in b),
+    Rule("world_traveler", (WORLD_COMPLETED,), _counter(3), goal=3),
+    Rule("rising_star", (XP,), lambda s, e: e.data["xp"] >= 700),
+    Rule("first_prompt", (PROMPT_SCORED,), lambda s, e: True),
+    Rule("prompt_perfectionist", (PROMPT_SCORED,), lambda s, e: e.data["score"] >= 90),
+    Rule("on_a_roll", (PROMPT_SCORED,), _counter(5, lambda e: e.data["score"] >= 70, streak=True), goal=5),
+    Rule("learning_from_mistakes", (MISTAKE,), _counter(10), goal=10),
+]
+
+RULES_BY_EVENT = defaultdict(list)
+for _rule in RULES:
+    for _kind in _rule.events:
+        RULES_BY_EVENT[_kind].append(_rule)
+RULES_BY_ID = {rule.badge_id: rule for rule in RULES}
+
+
+def _award(user_id: int, badge_id: str, awarded_at) -> dict:
+    if isinstance(awarded_at, datetime):
+        awarded_at = awarded_at.isoformat()
+    return {"user_id": user_id, "badge": BADGES_BY_ID[badge_id], "awarded_at": awarded_at}
+
+
+async def evaluate(db: AsyncSession, events: list) -> list:
+    """
+    Feed events (in order) to the rules indexed under their kinds, inside the
+    caller's transaction. Returns the newly awarded badges, to be announced
+    once the transaction has committed.
+    """
+    events = [e for e in events if e.kind in RULES_BY_EVENT]
+    if not events:
+        return []
+    keys = {(e.user_id, rule.badge_id) for e in events for rule in RULES_BY_EVENT[e.kind]}
+    user_ids = {user_id for user_id, _ in keys}
+    badge_ids = {badge_id for _, badge_id in keys}
+
+    earned = set((await db.execute(
+        select(UserBadge.user_id, UserBadge.badge_id)
+        .where(UserBadge.user_id.in_(user_ids), UserBadge.badge_id.in_(badge_ids))
+    )).all())
+    stateful = [k for k in keys if k not in earned and RULES_BY_ID[k[1]].goal is not None]
+    states = {}
+    if stateful:
+        result = await db.execute(
+            select(AchievementProgress.user_id, AchievementProgress.rule_id, AchievementProgress.state)
+            .where(tuple_(AchievementProgress.user_id, AchievementProgress.rule_id).in_(stateful))
+        )
+        states = {(user_id, rule_id): dict(state or {}) for user_id, rule_id, state in result}
+
+    new_awards, dirty = [], set()
+    for event in events:
+        for rule in RULES_BY_EVENT[event.kind]:
+            key = (event.user_id, rule.badge_id)
+            if key in earned:
+                continue
+            state = states.setdefault(key, {})
+            before = dict(state)
+            if rule.check(state, event):
+                earned.add(key)
+                new_awards.append(key)
+                dirty.discard(key)
+            elif state != before:
+                dirty.add(key)
+
+    if dirty:
+        stmt = upsert_insert(AchievementProgress)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AchievementProgress.user_id, AchievementProgress.rule_id],
+            set_={"state": stmt.excluded.state},
+        )
+        await db.execute(stmt, [{"user_id": u, "rule_id": r, "state": states[(u, r)]} for u, r in sorted(dirty)])
+    if not new_awards:
+        return []
+    # Another worker may have awarded the same badge concurrently; only rows we inserted are announced
+    stmt = upsert_insert(UserBadge).values([{"user_id": u, "badge_id": b} for u, b in new_awards])
+    stmt = stmt.on_conflict_do_nothing(index_elements=[UserBadge.user_id, UserBadge.badge_id])
+    result = await db.execute(stmt.returning(UserBadge.user_id, UserBadge.badge_id, UserBadge.awarded_at))
+    return [_award(*row) for row in result]
+
+
+async def user_achievements(db: AsyncSession, user_id: int) -> dict:
+    """Earned badges plus progress towards the counting ones, from two indexed lookups."""
+    result = await db.execute(
+        select(UserBadge.badge_id, UserBadge.awarded_at)
+        .where(UserBadge.user_id == user_id).order_by(UserBadge.awarded_at)
+    )
+    earned = [_award(user_id, badge_id, at) for badge_id, at in result if badge_id in BADGES_BY_ID]
+    earned_ids = {award["badge"]["id"] for award in earned}
+    result = await db.execute(
+        select(AchievementProgress.rule_id, AchievementProgress.state).where(AchievementProgress.user_id == user_id)
+    )
+    states = dict(result.all())
+    progress = [
+        {"badge": BADGES_BY_ID[rule.badge_id], "count": min((states.get(rule.badge_id) or {}).get("count", 0), rule.goal),
+         "goal": rule.goal}
+        for rule in RULES if rule.goal is not None and rule.badge_id not in earned_ids
+    ]
+    return {"earned": [{"badge": a["badge"], "awarded_at": a["awarded_at"]} for a in earned], "progress": progress}
@@ -0,0 +1,109 @@
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import PromptHistory, PromptScoreStats
+
+RECENT_WINDOW = 10   # scores kept for trend and rolling average
+STREAK_SCORE = 80    # a prompt at or above this extends the streak
+
+
+def new_score_stats(user_id: int) -> PromptScoreStats:
+    return PromptScoreStats(user_id=user_id, count=0, total=0, best=None, worst=None,
+                            recent_scores=[], current_streak=0, best_streak=0)
+
+
+def apply_score(stats: PromptScoreStats, score: int):
+    """Fold one new score into the running aggregate in O(1)."""
+    stats.count += 1
+    stats.total += score
+    stats.best = score if stats.best is None else max(stats.best, score)
+    stats.worst = score if stats.worst is None else min(stats.worst, score)
+    # Reassign rather than mutate so the JSON column is flagged dirty
+    stats.recent_scores = (list(stats.recent_scores or []) + [score])[-RECENT_WINDOW:]
+    stats.current_streak = stats.current_streak + 1 if score >= STREAK_SCORE else 0
+    stats.best_streak = max(stats.best_streak, stats.current_streak)
+
+
+def stats_payload(stats: PromptScoreStats) -> dict:
+    recent = stats.recent_scores or []
+    trend = "steady"
+    if len(recent) >= 3:
+        if recent[-1] > recent[-3]: trend = "improving"
+        elif recent[-1] < recent[-3]: trend = "declining"
+    return {
+        "count": stats.count,
+        "best": stats.best,
+        "worst": stats.worst,
+        "average": round(stats.total / stats.count, 1),
+        "trend": trend,
+        "rolling_average": round(sum(recent) / len(recent), 1),
+        "recent_scores": list(recent),
+        "current_streak": stats.current_streak,
+        "best_streak": stats.best_streak,
+    }
+
+
+async def range_score_stats(db: AsyncSession, user_id: int, since=None, until=None) -> PromptScoreStats:
+    """Fold the scores saved in [since, until) into a transient aggregate (not added to the session)."""
+    query = select(PromptHistory.score).where(PromptHistory.user_id == user_id)
+    if since is not None:
+        query = query.where(PromptHistory.created_at >= since)
+    if until is not None:
+        query = query.where(PromptHistory.created_at < until)
+    stats = new_score_stats(user_id)
+    for score in (await db.execute(query.order_by(PromptHistory.id))).scalars():
+        apply_score(stats, score)
+    return stats
+
+
+async def record_score(db: AsyncSession, user_id: int, score: int):
+    """Update the user's aggregate inside the caller's transaction (which commits it)."""
+    await record_scores(db, {user_id: [score]})
+
+
+async def record_scores(db: AsyncSession, scores_by_user: dict):
+    """Fold a batch of scores (per user, in arrival order) into the aggregates with one SELECT."""
+    result = await db.execute(
+        select(PromptScoreStats).where(PromptScoreStats.user_id.in_(scores_by_user)).with_for_update()
+    )
+    existing = {stats.user_id: stats for stats in result.scalars()}
+    for user_id, scores in scores_by_user.items():
+        stats = existing.get(user_id)
+        if stats is None:
+            stats = new_score_stats(user_id)
+            db.add(stats)
+        for score in scores:
+            apply_score(stats, score)
+
+
+async def _build_score_stats(conn, user_id: int):
+    """Recompute one user's aggregate from their history and insert it (no-op if they have none)."""
+    stats = new_score_stats(user_id)
+    scores = await conn.execute(
+        select(PromptHistory.score).where(PromptHistory.user_id == user_id).order_by(PromptHistory.id)
+    )
+    for score in scores.scalars():
+        apply_score(stats, score)
+    if not stats.count:
+        return
+    await conn.execute(insert(PromptScoreStats).values(
+        user_id=user_id, count=stats.count, total=stats.total, best=stats.best, worst=stats.worst,
+        recent_scores=stats.recent_scores, current_streak=stats.current_streak, best_streak=stats.best_streak,
+    ))
+
+
+async def backfill_score_stats(conn):
+    """Build aggregates for users whose history predates the prompt_score_stats table."""
+    missing = (await conn.execute(
+        select(PromptHistory.user_id).distinct()
+        .where(PromptHistory.user_id.not_in(select(PromptScoreStats.user_id)))
+    )).scalars().all()
+    for user_id in missing:
+        await _build_score_stats(conn, user_id)
+
+
+async def rebuild_score_stats(db, user_ids: list):
+    """Recompute aggregates after part of the users' history was deleted."""
+    await db.execute(delete(PromptScoreStats).where(PromptScoreStats.user_id.in_(user_ids)))
+    for user_id in user_ids:
+        await _build_score_stats(db, user_id)
@@ -0,0 +1,131 @@
+"""
+Downsampled prompt-score series for the dashboard chart.
+
+Long histories are reduced to a target number of points either with
+Largest-Triangle-Three-Buckets (keeps peaks and dips, so the line looks the
+same) or with fixed-width time buckets carrying min/avg/max. Results are
+cached per user and reused until that user's history changes.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import PromptHistory
+
+DEFAULT_POINTS = int(os.getenv("CHART_POINTS", "300"))
+CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "2000"))
+
+
+def lttb(points: list, threshold: int) -> list:
+    """Largest-Triangle-Three-Buckets over (x, y, ...) tuples; first and last points are always kept."""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        # Average of the next bucket is the third corner of the triangle
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = sum(p[0] for p in points[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(p[1] for p in points[next_start:next_end]) / (next_end - next_start)
+        ax, ay = points[a][0], points[a][1]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def time_buckets(rows: list, buckets: int) -> list:
+    """Group (created_at, score) rows into equal-width time buckets; empty buckets are omitted."""
+    if not rows:
+        return []
+    first, last = min(r[0] for r in rows), max(r[0] for r in rows)
+    width = (last - first) / buckets if last > first else None
+    grouped = OrderedDict()
+    for created_at, score in sorted(rows):
+        index = min(int((created_at - first) / width), buckets - 1) if width else 0
+        grouped.setdefault(index, []).append(score)
+    series = []
+    for index, scores in grouped.items():
+        start = first + width * index if width else first
+        avg = round(sum(scores) / len(scores), 1)
+        series.append({"x": start.isoformat(), "y": avg, "min": min(scores), "avg": avg,
+                       "max": max(scores), "count": len(scores)})
+    return series
+
+
+class ChartCache:
+    """LRU of built series, keyed by request shape and tagged with the history version it was built from."""
+
+    def __init__(self, max_size: int = CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, series):
+        with self._lock:
+            self._entries[key] = (version, series)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+chart_cache = ChartCache()
+
+
+async def chart_series(db: AsyncSession, user_id: int, stats_version: tuple, points: int = DEFAULT_POINTS,
+                       mode: str = "lttb", since=None, until=None) -> list:
+    """
+    Return the user's score series (optionally only rows saved in [since, until))
+    reduced to about `points` points. `stats_version` comes from the user's
+    aggregate row; together with the newest history id it changes whenever a row
+    is added or removed, which invalidates the cached series.
+    """
+    last_id = (await db.execute(
+        select(func.max(PromptHistory.id)).where(PromptHistory.user_id == user_id)
+    )).scalar()
+    version = (*stats_version, last_id)
+    key = (user_id, mode, points, since, until)
+    in_range = [PromptHistory.user_id == user_id]
+    if since is not None:
+        in_range.append(PromptHistory.created_at >= since)
+    if until is not None:
+        in_range.append(PromptHistory.created_at < until)
+    series = chart_cache.get(key, version)
+    if series is not None:
+        return series
+
+    if mode == "time":
+        rows = (await db.execute(
+            select(PromptHistory.created_at, PromptHistory.score).where(*in_range).order_by(PromptHistory.id)
+        )).all()
+        series = time_buckets([r for r in rows if r[0] is not None], points)
+    else:
+        rows = await db.execute(
+            select(PromptHistory.score, PromptHistory.grade).where(*in_range).order_by(PromptHistory.id)
+        )
+        full = [(i + 1, score, grade) for i, (score, grade) in enumerate(rows)]
+        series = [{"x": x, "y": y, "grade": grade} for x, y, grade in lttb(full, points)]
+
+    chart_cache.put(key, version, series)
+    return series
@@ -0,0 +1,109 @@
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import upsert_insert
+from .models import CohortCounter, CohortMember
+
+KIND_TOPIC = "topic"
+KIND_GRADE = "grade"
+KIND_SCORE = "score"
+SCORE_BUCKET_WIDTH = 10
+
+WINDOW_DAYS = int(os.getenv("COHORT_WINDOW_DAYS", "7"))
+RETENTION_DAYS = int(os.getenv("COHORT_RETENTION_DAYS", "90"))
+CACHE_TTL_SECONDS = float(os.getenv("COHORT_CACHE_TTL", "15"))
+
+
+def _day(offset: int = 0) -> str:
+    return (datetime.now(timezone.utc).date() - timedelta(days=offset)).isoformat()
+
+
+def score_bucket(score: int) -> int:
+    """Lower bound of the score's histogram bucket; 100 shares the top bucket with 90-99."""
+    return min(max(score, 0), 100 - SCORE_BUCKET_WIDTH) // SCORE_BUCKET_WIDTH * SCORE_BUCKET_WIDTH
+
+
+async def record_cohort_activity(db: AsyncSession, mistakes: dict = None, prompts: list = None):
+    """
+    Bump today's counters for every cohort the writers belong to, inside the
+    caller's transaction. `mistakes` maps (user_id, topic) -> count and
+    `prompts` is a list of (user_id, score, grade).
+    """
+    mistakes, prompts = mistakes or {}, prompts or []
+    user_ids = {user_id for user_id, _ in mistakes} | {user_id for user_id, _, _ in prompts}
+    if not user_ids:
+        return
+    result = await db.execute(
+        select(CohortMember.user_id, CohortMember.cohort_id).where(CohortMember.user_id.in_(user_ids))
+    )
+    cohorts_by_user = defaultdict(list)
+    for user_id, cohort_id in result:
+        cohorts_by_user[user_id].append(cohort_id)
+    if not cohorts_by_user:
+        return
+
+    day = _day()
+    increments = defaultdict(int)
+    for (user_id, topic), count in mistakes.items():
+        for cohort_id in cohorts_by_user.get(user_id, ()):
+            increments[(cohort_id, KIND_TOPIC, topic)] += count
+    for user_id, score, grade in prompts:
+        for cohort_id in cohorts_by_user.get(user_id, ()):
+            increments[(cohort_id, KIND_GRADE, grade)] += 1
+            increments[(cohort_id, KIND_SCORE, str(score_bucket(score)))] += 1
+
+    stmt = upsert_insert(CohortCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CohortCounter.cohort_id, CohortCounter.kind, CohortCounter.key, CohortCounter.day],
+        set_={"value": CohortCounter.value + stmt.excluded.value},
+    )
+    # Sorted so concurrent writers lock counter rows in the same order
+    await db.execute(stmt, [
+        {"cohort_id": cohort_id, "kind": kind, "key": key, "day": day, "value": count}
+        for (cohort_id, kind, key), count in sorted(increments.items())
+    ])
+
+
+async def counter_totals(db: AsyncSession, cohort_id: int, kind: str, days: int = WINDOW_DAYS) -> dict:
+    """Sum a cohort's counters of one kind over the last `days` days (today included)."""
+    result = await db.execute(
+        select(CohortCounter.key, func.sum(CohortCounter.value))
+        .where(CohortCounter.cohort_id == cohort_id, CohortCounter.kind == kind, CohortCounter.day >= _day(days - 1))
+        .group_by(CohortCounter.key)
+    )
+    return {key: int(total) for key, total in result}
+
+
+async def prune_cohort_counters(conn, keep_days: int = RETENTION_DAYS):
+    """Drop daily counters that have aged out of every window we serve."""
+    await conn.execute(delete(CohortCounter).where(CohortCounter.day < _day(keep_days)))
+
+
+class TTLCache:
+    """Small process-level cache for dashboard payloads that may be a few seconds stale."""
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, cohort_id: int):
+        for key in [k for k in self._entries if k[0] == cohort_id]:
+            del self._entries[key]
+
+
+cohort_cache = TTLCache()
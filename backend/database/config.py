@@ -0,0 +1,185 @@
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///./promptquest.db"
+# Server databases take many concurrent writers, unlike SQLite's single write lock
+SERVER_POOL_SIZE = 10
+SERVER_MAX_OVERFLOW = 10
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class StorageSettings:
+    """Connection and tuning options for the app database, read from PROMPTQUEST_DB_* env vars."""
+    url: str = DEFAULT_DATABASE_URL
+    # Optional separate URL for read-only endpoints (e.g. a PostgreSQL replica); defaults to `url`
+    read_url: str = ""
+    # Driver isolation level (e.g. "READ COMMITTED", "REPEATABLE READ"); empty keeps the driver default
+    isolation_level: str = ""
+    # Prepared statements cached per connection: sqlite3's statement cache, or asyncpg's
+    # server-side prepared statements. 0 disables the cache (needed behind pgbouncer in
+    # transaction mode).
+    statement_cache_size: int = 100
+
+    # SQLite tuning (ignored by other backends)
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    busy_timeout_ms: int = 5000
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size_kib: int = 20000
+    # Take the write lock when a write transaction starts instead of upgrading a read
+    # lock mid-transaction, which fails immediately with "database is locked" in WAL mode
+    begin_immediate: bool = True
+
+    # Writers queue in the pool rather than spinning on SQLite's busy handler
+    pool_size: int = 1
+    max_overflow: int = 2
+    pool_timeout: float = 30.0
+    # Recycle server connections before a proxy or the server drops them; -1 never recycles
+    pool_recycle: int = -1
+    # Read-only endpoints get their own pool so they never wait behind writers
+    read_pool_size: int = 8
+    read_max_overflow: int = 8
+
+    # Group commit for high-frequency analytics events: "off" (one transaction per
+    # request), "enqueue" (ack once queued) or "flush" (ack once the batch commits)
+    write_behind_mode: str = "flush"
+    write_behind_interval_ms: int = 25
+    write_behind_max_batch: int = 500
+    write_behind_max_queue: int = 10000
+    write_behind_enqueue_timeout: float = 2.0
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.url.startswith("sqlite")
+
+    @property
+    def is_postgres(self) -> bool:
+        return self.url.startswith("postgresql")
+
+    @property
+    def is_memory(self) -> bool:
+        return self.is_sqlite and (":memory:" in self.url or self.url.endswith("://"))
+
+
+def load_settings() -> StorageSettings:
+    defaults = StorageSettings()
+    url = os.getenv("PROMPTQUEST_DB_URL", defaults.url)
+    server = not url.startswith("sqlite")
+    return StorageSettings(
+        url=url,
+        read_url=os.getenv("PROMPTQUEST_DB_READ_URL", defaults.read_url),
+        isolation_level=os.getenv("PROMPTQUEST_DB_ISOLATION_LEVEL", defaults.isolation_level).upper(),
+        statement_cache_size=_env_int("PROMPTQUEST_DB_STATEMENT_CACHE_SIZE", defaults.statement_cache_size),
+        journal_mode=os.getenv("PROMPTQUEST_DB_JOURNAL_MODE", defaults.journal_mode).upper(),
+        synchronous=os.getenv("PROMPTQUEST_DB_SYNCHRONOUS", defaults.synchronous).upper(),
+        busy_timeout_ms=_env_int("PROMPTQUEST_DB_BUSY_TIMEOUT_MS", defaults.busy_timeout_ms),
+        mmap_size=_env_int("PROMPTQUEST_DB_MMAP_SIZE", defaults.mmap_size),
+        cache_size_kib=_env_int("PROMPTQUEST_DB_CACHE_SIZE_KIB", defaults.cache_size_kib),
+        begin_immediate=_env_bool("PROMPTQUEST_DB_BEGIN_IMMEDIATE", defaults.begin_immediate),
+        pool_size=_env_int("PROMPTQUEST_DB_POOL_SIZE", SERVER_POOL_SIZE if server else defaults.pool_size),
+        max_overflow=_env_int("PROMPTQUEST_DB_MAX_OVERFLOW", SERVER_MAX_OVERFLOW if server else defaults.max_overflow),
+        pool_timeout=float(os.getenv("PROMPTQUEST_DB_POOL_TIMEOUT", defaults.pool_timeout)),
+        pool_recycle=_env_int("PROMPTQUEST_DB_POOL_RECYCLE", defaults.pool_recycle),
+        read_pool_size=_env_int("PROMPTQUEST_DB_READ_POOL_SIZE", defaults.read_pool_size),
+        read_max_overflow=_env_int("PROMPTQUEST_DB_READ_MAX_OVERFLOW", defaults.read_max_overflow),
+        write_behind_mode=os.getenv("PROMPTQUEST_WRITE_BEHIND", defaults.write_behind_mode).lower(),
+        write_behind_interval_ms=_env_int("PROMPTQUEST_WRITE_BEHIND_INTERVAL_MS", defaults.write_behind_interval_ms),
+        write_behind_max_batch=_env_int("PROMPTQUEST_WRITE_BEHIND_MAX_BATCH", defaults.write_behind_max_batch),
+        write_behind_max_queue=_env_int("PROMPTQUEST_WRITE_BEHIND_MAX_QUEUE", defaults.write_behind_max_queue),
+        write_behind_enqueue_timeout=float(os.getenv("PROMPTQUEST_WRITE_BEHIND_ENQUEUE_TIMEOUT", defaults.write_behind_enqueue_timeout)),
+    )
+
+
+def sqlite_pragmas(settings: StorageSettings, read_only: bool = False) -> list[str]:
+    pragmas = [
+        f"PRAGMA journal_mode={settings.journal_mode}",
+        f"PRAGMA synchronous={settings.synchronous}",
+        f"PRAGMA busy_timeout={settings.busy_timeout_ms}",
+        f"PRAGMA mmap_size={settings.mmap_size}",
+        f"PRAGMA cache_size=-{settings.cache_size_kib}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def _configure_sqlite(engine: AsyncEngine, settings: StorageSettings, read_only: bool):
+    pragmas = sqlite_pragmas(settings, read_only)
+    immediate = settings.begin_immediate and not read_only
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if immediate:
+            # Hand transaction control to the "begin" hook below
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    if immediate:
+        @event.listens_for(engine.sync_engine, "begin")
+        def on_begin(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _pool_options(settings: StorageSettings, read_only: bool) -> dict:
+    if settings.is_memory:
+        return {}
+    if read_only:
+        size, overflow = settings.read_pool_size, settings.read_max_overflow
+    else:
+        size, overflow = settings.pool_size, settings.max_overflow
+    options = {"pool_size": size, "max_overflow": overflow, "pool_timeout": settings.pool_timeout,
+               "pool_recycle": settings.pool_recycle}
+    if not settings.is_sqlite:
+        options["pool_pre_ping"] = True
+    return options
+
+
+def _connect_args(settings: StorageSettings, read_only: bool) -> dict:
+    if settings.is_sqlite:
+        return {"check_same_thread": False, "cached_statements": settings.statement_cache_size}
+    if settings.is_postgres:
+        # asyncpg prepares every statement server-side; SQLAlchemy keeps an LRU of them per connection
+        args = {"prepared_statement_cache_size": settings.statement_cache_size}
+        if read_only:
+            args["server_settings"] = {"default_transaction_read_only": "on"}
+        return args
+    return {}
+
+
+def create_engine_for(settings: StorageSettings, read_only: bool = False) -> AsyncEngine:
+    url = (settings.read_url or settings.url) if read_only else settings.url
+    options = _pool_options(settings, read_only)
+    # SQLite transaction control is handled by _configure_sqlite (BEGIN IMMEDIATE)
+    if settings.isolation_level and not settings.is_sqlite:
+        options["isolation_level"] = settings.isolation_level
+    engine = create_async_engine(url, connect_args=_connect_args(settings, read_only), echo=False, **options)
+    if settings.is_sqlite:
+        _configure_sqlite(engine, settings, read_only)
+    return engine
+
+
+def create_engines(settings: StorageSettings) -> tuple[AsyncEngine, AsyncEngine]:
+    """Build the (write, read) engine pair. In-memory SQLite shares one engine, since each connection is its own DB."""
+    write_engine = create_engine_for(settings)
+    if settings.is_memory:
+        return write_engine, write_engine
+    return write_engine, create_engine_for(settings, read_only=True)
@@ -1,16 +1,28 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./promptquest.db"
+from .config import create_engines, load_settings
 
-engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, echo=False
-)
+settings = load_settings()
+SQLALCHEMY_DATABASE_URL = settings.url
+
+# Writes go through `engine`; read-only endpoints use `read_engine` so they never queue behind writers
+engine, read_engine = create_engines(settings)
 
 SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+ReadSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=read_engine, class_=AsyncSession)
 
 Base = declarative_base()
 
+# INSERT builder with ON CONFLICT ... DO UPDATE / DO NOTHING for the configured backend;
+# the SQLite and PostgreSQL constructs share the same API, including RETURNING
+upsert_insert = postgresql.insert if settings.is_postgres else sqlite.insert
+
 async def get_db():
     async with SessionLocal() as session:
         yield session
+
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
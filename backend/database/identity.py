@@ -0,0 +1,153 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Tokens are "<user id>.<issued at>.<hmac>". Set PROMPTQUEST_SECRET in production so they survive
+# restarts and are shared by every worker; without it each process signs with a random key.
+_CONFIGURED_SECRET = os.getenv("PROMPTQUEST_SECRET", "")
+if not _CONFIGURED_SECRET:
+    logger.warning("PROMPTQUEST_SECRET is not set; session tokens are signed with a random per-process key")
+SECRET = (_CONFIGURED_SECRET or secrets.token_hex(32)).encode()
+TOKEN_TTL_SECONDS = int(os.getenv("PROMPTQUEST_TOKEN_TTL", str(7 * 24 * 3600)))
+TOKEN_COOKIE = "pq_token"
+PASSWORD_ITERATIONS = int(os.getenv("PROMPTQUEST_PASSWORD_ITERATIONS", "200000"))
+# Shared secret for admin endpoints (sent as X-Admin-Token); admin routes are disabled when unset
+ADMIN_TOKEN = os.getenv("PROMPTQUEST_ADMIN_TOKEN", "")
+DEFAULT_USERNAME = "student"
+
+CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+# Bounds how stale a cached XP value can get when another process wrote it
+CACHE_TTL_SECONDS = float(os.getenv("IDENTITY_CACHE_TTL", "300"))
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Snapshot of the authenticated user; safe to share between requests."""
+    id: int
+    username: str
+    xp: int
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SECRET, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode()
+
+
+def issue_token(user_id: int, now: Optional[float] = None) -> str:
+    payload = f"{user_id}.{int(time.time() if now is None else now)}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str, now: Optional[float] = None) -> Optional[int]:
+    """Return the user id a token was issued for, or None if it is malformed, forged or expired."""
+    payload, _, signature = token.rpartition(".")
+    user_id, _, issued_at = payload.partition(".")
+    if not (user_id.isdigit() and issued_at.isdigit()):
+        return None
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    age = (time.time() if now is None else now) - int(issued_at)
+    # A minute of leeway for clock skew between the workers that issue and check tokens
+    if age < -60 or age >= TOKEN_TTL_SECONDS:
+        return None
+    return int(user_id)
+
+
+def hash_password(password: str) -> str:
+    """PBKDF2-SHA256 hash as "pbkdf2_sha256$<iterations>$<salt>$<digest>". CPU-bound; call off the event loop."""
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), PASSWORD_ITERATIONS)
+    return f"pbkdf2_sha256${PASSWORD_ITERATIONS}${salt}${base64.b64encode(digest).decode()}"
+
+
+def check_password(password: str, stored: str) -> bool:
+    algorithm, _, rest = stored.partition("$")
+    iterations, _, rest = rest.partition("$")
+    salt, _, expected = rest.partition("$")
+    if algorithm != "pbkdf2_sha256" or not iterations.isdigit():
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), int(iterations))
+    return hmac.compare_digest(base64.b64encode(digest).decode().encode(), expected.encode())
+
+
+class IdentityCache:
+    """Process-level LRU of user identities, indexed by id and by username."""
+
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._by_id = OrderedDict()  # user id -> (Identity, expires_at)
+        self._ids_by_username = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Identity]:
+        with self._lock:
+            entry = self._by_id.get(user_id)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at < time.monotonic():
+                self._drop(user_id)
+                return None
+            self._by_id.move_to_end(user_id)
+            return identity
+
+    def get_by_username(self, username: str) -> Optional[Identity]:
+        user_id = self._ids_by_username.get(username)
+        return self.get(user_id) if user_id is not None else None
+
+    def put(self, identity: Identity):
+        with self._lock:
+            self._drop(identity.id)
+            self._by_id[identity.id] = (identity, time.monotonic() + self.ttl)
+            self._ids_by_username[identity.username] = identity.id
+            while len(self._by_id) > self.max_size:
+                oldest = next(iter(self._by_id))
+                self._drop(oldest)
+
+    def update_xp(self, user_id: int, xp: int):
+        """Refresh a cached entry after an XP change committed by this process."""
+        identity = self.get(user_id)
+        if identity is not None:
+            self.put(replace(identity, xp=xp))
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._drop(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._ids_by_username.clear()
+
+    def _drop(self, user_id: int):
+        entry = self._by_id.pop(user_id, None)
+        if entry is not None and self._ids_by_username.get(entry[0].username) == user_id:
+            del self._ids_by_username[entry[0].username]
+
+
+identity_cache = IdentityCache()
+
+
+def token_from_request(request) -> Optional[str]:
+    """Read a bearer token from the Authorization header, falling back to the session cookie."""
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip()
+    return request.cookies.get(TOKEN_COOKIE)
+
+
+def is_admin_request(request) -> bool:
+    supplied = request.headers.get("x-admin-token", "")
+    # Compare bytes: compare_digest raises TypeError on non-ASCII str
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
@@ -0,0 +1,214 @@
+"""
+In-memory XP leaderboard.
+
+Users are kept in an indexable skip list ordered by (-xp, user_id), so top-N,
+rank-of-user and around-me windows are O(log n) instead of an ORDER BY over
+the whole users table per request. The index is loaded from `users` at
+startup and updated from the leaderboard events every worker publishes.
+Events carry the user's `xp_version` from the committing transaction, and an
+event older than the one already applied is ignored, so updates published out
+of commit order never move a user back to a lower XP.
+"""
+import os
+import random
+
+from sqlalchemy import select
+
+from .models import User
+
+MAX_LEVEL = 24
+SNAPSHOT_SIZE = int(os.getenv("LEADERBOARD_SNAPSHOT_SIZE", "100"))
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next = [None] * level
+        self.width = [1] * level  # items skipped by following next[i], the target included
+
+
+class IndexableSkipList:
+    """Sorted keys with O(log n) insert, remove, rank and positional lookup."""
+
+    def __init__(self):
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key):
+        update, ranks = [None] * MAX_LEVEL, [0] * MAX_LEVEL
+        node, rank = self._head, 0
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                rank += node.width[i]
+                node = node.next[i]
+            update[i], ranks[i] = node, rank
+        level = self._random_level()
+        self._level = max(self._level, level)
+        new = _Node(key, level)
+        for i in range(MAX_LEVEL):
+            prev = update[i]
+            if i < level:
+                new.next[i] = prev.next[i]
+                prev.next[i] = new
+                # rank + 1 is the new node's position; split prev's span around it
+                new.width[i] = prev.width[i] - (rank - ranks[i])
+                prev.width[i] = rank - ranks[i] + 1
+            else:
+                prev.width[i] += 1
+        self._size += 1
+
+    def remove(self, key):
+        update = [None] * MAX_LEVEL
+        node = self._head
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+        target = node.next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for i in range(MAX_LEVEL):
+            prev = update[i]
+            if prev.next[i] is target:
+                prev.width[i] += target.width[i] - 1
+                prev.next[i] = target.next[i]
+            else:
+                prev.width[i] -= 1
+        self._size -= 1
+
+    def rank(self, key) -> int:
+        """0-based position of an existing key."""
+        node, rank = self._head, 0
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key <= key:
+                rank += node.width[i]
+                node = node.next[i]
+        if node.key != key:
+            raise KeyError(key)
+        return rank - 1
+
+    def count_less(self, key) -> int:
+        """Number of keys sorting before `key` (which need not be in the list)."""
+        node, rank = self._head, 0
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                rank += node.width[i]
+                node = node.next[i]
+        return rank
+
+    def slice(self, start: int, stop: int) -> list:
+        """Keys at positions [start, stop)."""
+        start, stop = max(start, 0), min(stop, self._size)
+        if start >= stop:
+            return []
+        node, position = self._head, -1
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and position + node.width[i] <= start:
+                position += node.width[i]
+                node = node.next[i]
+        keys = []
+        while node is not None and len(keys) < stop - start:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class Leaderboard:
+    """Process-level ranked index of users by XP; ties go to the older account."""
+
+    def __init__(self):
+        self._index = IndexableSkipList()
+        self._users = {}  # user id -> (username, xp)
+        self._versions = {}  # user id -> xp_version of the applied XP
+
+    def __len__(self):
+        return len(self._index)
+
+    async def load(self, conn):
+        self.__init__()
+        result = await conn.execute(select(User.id, User.username, User.xp, User.xp_version))
+        for user_id, username, xp, version in result:
+            self.update(user_id, username, xp or 0, version or 0)
+
+    def update(self, user_id: int, username: str, xp: int, version: int = None) -> bool:
+        """
+        Apply a user's XP; returns False when the update is stale. Without a
+        version (e.g. from a cached identity) only unknown users are added.
+        """
+        current = self._users.get(user_id)
+        if current is not None:
+            if version is None:
+                return False
+            if version <= self._versions.get(user_id, -1):
+                return False
+        if version is not None:
+            self._versions[user_id] = version
+        if current == (username, xp):
+            return True
+        if current is not None and current[1] != xp:
+            self._index.remove((-current[1], user_id))
+        if current is None or current[1] != xp:
+            self._index.insert((-xp, user_id))
+        self._users[user_id] = (username, xp)
+        return True
+
+    def rename(self, user_id: int, username: str):
+        if user_id in self._users:
+            self._users[user_id] = (username, self._users[user_id][1])
+
+    def _entries(self, keys: list, first_rank: int) -> list:
+        return [
+            {"rank": first_rank + i, "user_id": user_id, "username": self._users[user_id][0], "xp": -neg_xp}
+            for i, (neg_xp, user_id) in enumerate(keys)
+        ]
+
+    def top(self, limit: int = 10, offset: int = 0) -> list:
+        return self._entries(self._index.slice(offset, offset + limit), offset + 1)
+
+    def rank_of(self, user_id: int):
+        """1-based rank, or None for a user not on the board."""
+        current = self._users.get(user_id)
+        if current is None:
+            return None
+        return self._index.rank((-current[1], user_id)) + 1
+
+    def ahead_of(self, user_id: int, xp: int) -> int:
+        """How many users currently sort ahead of `user_id` holding `xp`."""
+        return self._index.count_less((-xp, user_id))
+
+    def xp_of(self, user_id: int):
+        current = self._users.get(user_id)
+        return current[1] if current else None
+
+    def entry(self, user_id: int):
+        rank = self.rank_of(user_id)
+        if rank is None:
+            return None
+        username, xp = self._users[user_id]
+        return {"rank": rank, "user_id": user_id, "username": username, "xp": xp}
+
+    def around(self, user_id: int, window: int = 5) -> list:
+        """Up to `window` users on each side of the given user, the user included."""
+        rank = self.rank_of(user_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - window, 0)
+        return self._entries(self._index.slice(start, rank + window), start + 1)
+
+    def snapshot(self, limit: int = SNAPSHOT_SIZE) -> dict:
+        return {"type": "leaderboard_snapshot", "data": {"total": len(self), "top": self.top(limit)}}
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,166 @@
+"""
+Versioned schema migrations, applied in order at startup.
+
+`Base.metadata.create_all` only creates missing tables, so anything added to an
+existing table (indexes, constraints, backfills) goes here as a new migration.
+Applied versions are recorded in `schema_migrations`; never edit a migration
+once it has shipped, add a new one instead.
+"""
+import logging
+from dataclasses import dataclass
+from functools import partial
+
+from sqlalchemy import insert, inspect, select, text
+
+from .db import upsert_insert
+from .models import AchievementProgress, PromptHistory, UserBadge
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple  # SQL strings, or async callables taking the connection
+
+
+async def _add_column(conn, table: str, column: str, ddl: str):
+    """ADD COLUMN unless create_all already made it (fresh databases get the current model)."""
+    existing = await conn.run_sync(lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns(table)})
+    if column not in existing:
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+async def _seed_counting_badges(conn):
+    """
+    Start the counting badges from each user's history instead of zero: award the
+    ones already reached and store the running count for the rest. Goals are
+    frozen here (3 worlds, 10 mistakes, 5 prompts of 70+ in a row) like the rest
+    of a shipped migration.
+    """
+    earned = {tuple(row) for row in await conn.execute(text("SELECT user_id, badge_id FROM user_badges"))}
+    counts = {}
+    for rule_id, sql in (
+        ("world_traveler", "SELECT user_id, COUNT(*) FROM completed_worlds GROUP BY user_id"),
+        ("learning_from_mistakes", "SELECT user_id, SUM(count) FROM mistakes GROUP BY user_id"),
+    ):
+        for user_id, count in await conn.execute(text(sql)):
+            counts[(user_id, rule_id)] = count or 0
+    goals = {"world_traveler": 3, "learning_from_mistakes": 10, "on_a_roll": 5}
+
+    # on_a_roll: the run of 70+ scores at the end of the history, or when a run first reached 5
+    rolled_at = {}
+    # Selected through the model so created_at comes back as a datetime on every backend
+    result = await conn.execute(
+        select(PromptHistory.user_id, PromptHistory.score, PromptHistory.created_at)
+        .order_by(PromptHistory.user_id, PromptHistory.id)
+    )
+    for user_id, score, created_at in result:
+        if user_id in rolled_at:
+            continue
+        run = counts.get((user_id, "on_a_roll"), 0) + 1 if (score or 0) >= 70 else 0
+        counts[(user_id, "on_a_roll")] = run
+        if run >= goals["on_a_roll"]:
+            rolled_at[user_id] = created_at
+
+    badges, dated_badges, progress = [], [], []
+    for (user_id, rule_id), count in sorted(counts.items()):
+        if (user_id, rule_id) in earned:
+            continue
+        if rule_id == "on_a_roll" and user_id in rolled_at:
+            dated_badges.append({"user_id": user_id, "badge_id": rule_id, "awarded_at": rolled_at[user_id]})
+        elif count >= goals[rule_id]:
+            badges.append({"user_id": user_id, "badge_id": rule_id})
+        elif count:
+            progress.append({"user_id": user_id, "rule_id": rule_id, "state": {"count": count}})
+    if badges:
+        await conn.execute(insert(UserBadge), badges)
+    if dated_badges:
+        await conn.execute(insert(UserBadge), dated_badges)
+    if progress:
+        # Counts kept since the engine shipped only cover part of the history; the full count replaces them
+        stmt = upsert_insert(AchievementProgress)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AchievementProgress.user_id, AchievementProgress.rule_id],
+            set_={"state": stmt.excluded.state},
+        )
+        await conn.execute(stmt, progress)
+
+
+MIGRATIONS = [
+    Migration(1, "unique mistakes and completed worlds per user", (
+        # Databases created before the unique indexes existed may hold duplicate rows;
+        # fold them together, then add the indexes the upsert paths rely on.
+        """UPDATE mistakes SET count = (
+               SELECT SUM(m2.count) FROM mistakes m2 WHERE m2.user_id = mistakes.user_id AND m2.topic = mistakes.topic)
+           WHERE id IN (SELECT MIN(id) FROM mistakes GROUP BY user_id, topic HAVING COUNT(*) > 1)""",
+        "DELETE FROM mistakes WHERE id NOT IN (SELECT MIN(id) FROM mistakes GROUP BY user_id, topic)",
+        "DELETE FROM completed_worlds WHERE id NOT IN (SELECT MIN(id) FROM completed_worlds GROUP BY user_id, world_id)",
+        # (user_id, topic) and (user_id, world_id) also serve every per-user lookup on these tables
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_mistakes_user_topic ON mistakes (user_id, topic)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_completed_worlds_user_world ON completed_worlds (user_id, world_id)",
+    )),
+    Migration(2, "prompt history by user in id order", (
+        "CREATE INDEX IF NOT EXISTS ix_prompt_history_user_id_id ON prompt_history (user_id, id)",
+    )),
+    Migration(3, "award badges already earned before the achievement engine", (
+        """INSERT INTO user_badges (user_id, badge_id, awarded_at)
+           SELECT user_id, CASE world_id
+               WHEN 1 THEN 'ai_explorer' WHEN 2 THEN 'prediction_pro' WHEN 3 THEN 'token_master'
+               WHEN 4 THEN 'prompt_master' WHEN 5 THEN 'truth_seeker' WHEN 6 THEN 'ai_trainer'
+               WHEN 7 THEN 'context_wizard' END, completed_at
+           FROM completed_worlds WHERE world_id BETWEEN 1 AND 7""",
+        "INSERT INTO user_badges (user_id, badge_id) SELECT id, 'rising_star' FROM users WHERE xp >= 700",
+        """INSERT INTO user_badges (user_id, badge_id)
+           SELECT user_id, 'world_traveler' FROM completed_worlds GROUP BY user_id HAVING COUNT(*) >= 3""",
+    )),
+    Migration(4, "version counter for ordering XP updates", (
+        partial(_add_column, table="users", column="xp_version", ddl="INTEGER NOT NULL DEFAULT 0"),
+    )),
+    Migration(5, "award prompt badges and seed badge progress from existing history", (
+        """INSERT INTO user_badges (user_id, badge_id, awarded_at)
+           SELECT user_id, 'first_prompt', MIN(created_at) FROM prompt_history p
+           WHERE NOT EXISTS (SELECT 1 FROM user_badges b WHERE b.user_id = p.user_id AND b.badge_id = 'first_prompt')
+           GROUP BY user_id""",
+        """INSERT INTO user_badges (user_id, badge_id, awarded_at)
+           SELECT user_id, 'prompt_perfectionist', MIN(created_at) FROM prompt_history p
+           WHERE score >= 90 AND NOT EXISTS (
+               SELECT 1 FROM user_badges b WHERE b.user_id = p.user_id AND b.badge_id = 'prompt_perfectionist')
+           GROUP BY user_id""",
+        _seed_counting_badges,
+    )),
+]
+
+CREATE_VERSION_TABLE = """CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)"""
+
+
+async def applied_versions(conn) -> set:
+    await conn.execute(text(CREATE_VERSION_TABLE))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result}
+
+
+async def run_migrations(conn) -> list:
+    """Apply pending migrations inside the caller's transaction; return the versions applied."""
+    done = await applied_versions(conn)
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        for statement in migration.statements:
+            if callable(statement):
+                await statement(conn)
+            else:
+                await conn.execute(text(statement))
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": migration.version, "name": migration.name},
+        )
+        logger.info("applied migration %d: %s", migration.version, migration.name)
+        applied.append(migration.version)
+    return applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, JSON, Table
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .db import Base
@@ -9,6 +9,8 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, default="student")
     xp = Column(Integer, default=0)
+    # Bumped by every XP update, so workers can drop leaderboard events that arrive out of order
+    xp_version = Column(Integer, default=0, server_default="0", nullable=False)
     
     # Relationships
     completed_worlds = relationship("CompletedWorld", back_populates="user", cascade="all, delete-orphan")
@@ -17,6 +19,7 @@ class User(Base):
 
 class CompletedWorld(Base):
     __tablename__ = "completed_worlds"
+    __table_args__ = (Index("uq_completed_worlds_user_world", "user_id", "world_id", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -27,6 +30,7 @@ class CompletedWorld(Base):
 
 class Mistake(Base):
     __tablename__ = "mistakes"
+    __table_args__ = (Index("uq_mistakes_user_topic", "user_id", "topic", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -37,6 +41,7 @@ class Mistake(Base):
 
 class PromptHistory(Base):
     __tablename__ = "prompt_history"
+    __table_args__ = (Index("ix_prompt_history_user_id_id", "user_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -47,3 +52,75 @@ class PromptHistory(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="prompt_history")
+
+class PromptScoreStats(Base):
+    """Per-user running aggregate of prompt scores, maintained on every save."""
+    __tablename__ = "prompt_score_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    count = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    best = Column(Integer)
+    worst = Column(Integer)
+    recent_scores = Column(JSON, default=list)  # last RECENT_WINDOW scores, oldest first
+    current_streak = Column(Integer, default=0)
+    best_streak = Column(Integer, default=0)
+
+class Cohort(Base):
+    """A class or group of students that instructors view together."""
+    __tablename__ = "cohorts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class CohortMember(Base):
+    __tablename__ = "cohort_members"
+    __table_args__ = (Index("ix_cohort_members_cohort_id", "cohort_id"),)
+
+    # user_id leads the primary key: every analytics write looks up the writer's cohorts
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    cohort_id = Column(Integer, ForeignKey("cohorts.id"), primary_key=True)
+    joined_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class CohortCounter(Base):
+    """Per-cohort daily counter (mistakes per topic, prompts per grade or score bucket), bumped on write."""
+    __tablename__ = "cohort_counters"
+
+    cohort_id = Column(Integer, ForeignKey("cohorts.id"), primary_key=True)
+    kind = Column(String, primary_key=True)   # "topic", "grade" or "score"
+    key = Column(String, primary_key=True)
+    day = Column(String(10), primary_key=True)  # UTC date, YYYY-MM-DD
+    value = Column(Integer, default=0)
+
+class UserBadge(Base):
+    """A badge awarded by the achievement engine; at most one row per user and badge."""
+    __tablename__ = "user_badges"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    badge_id = Column(String, primary_key=True)
+    awarded_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AchievementProgress(Base):
+    """Per-user state of a stateful achievement rule (e.g. a running count or streak)."""
+    __tablename__ = "achievement_progress"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    rule_id = Column(String, primary_key=True)
+    state = Column(JSON, default=dict)
+
+class UserCredential(Base):
+    """Password hash for a user; accounts created before passwords existed have no row."""
+    __tablename__ = "user_credentials"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    password_hash = Column(String, nullable=False)
+
+class AnsweredQuestion(Base):
+    """A question a user has answered correctly; XP for it is awarded only when the row is first inserted."""
+    __tablename__ = "answered_questions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    world = Column(Integer, primary_key=True)
+    question_key = Column(String, primary_key=True)
+    answered_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,61 @@
+"""
+EXPLAIN QUERY PLAN check for the hot per-user queries.
+
+Each entry mirrors a query issued by a router on every request. A plan that
+full-scans a table or sorts through a temp B-tree means an index is missing.
+SQLite only; other backends are skipped.
+"""
+import logging
+
+from sqlalchemy import delete, select, text
+
+from .models import CohortCounter, CohortMember, CompletedWorld, Mistake, PromptHistory, PromptScoreStats, User
+
+logger = logging.getLogger(__name__)
+
+HOT_QUERIES = {
+    "user by username": select(User).where(User.username == "student"),
+    "mistake summary": select(Mistake).where(Mistake.user_id == 1),
+    "mistake upsert count": select(Mistake.count).where(Mistake.user_id == 1, Mistake.topic == "pattern"),
+    "completed worlds": select(CompletedWorld).where(CompletedWorld.user_id == 1),
+    "prompt history page": select(PromptHistory.id, PromptHistory.score)
+        .where(PromptHistory.user_id == 1, PromptHistory.id < 1000)
+        .order_by(PromptHistory.id.desc()).limit(101),
+    "prompt history chart": select(PromptHistory.score, PromptHistory.grade)
+        .where(PromptHistory.user_id == 1).order_by(PromptHistory.id),
+    "score stats": select(PromptScoreStats).where(PromptScoreStats.user_id.in_([1, 2])),
+    "writer cohorts": select(CohortMember.cohort_id).where(CohortMember.user_id.in_([1, 2])),
+    "cohort counters": select(CohortCounter.key, CohortCounter.value)
+        .where(CohortCounter.cohort_id == 1, CohortCounter.kind == "topic", CohortCounter.day >= "2024-01-01"),
+    "reset mistakes": delete(Mistake).where(Mistake.user_id.in_([1, 2])),
+    "reset prompt history": delete(PromptHistory).where(PromptHistory.user_id.in_([1, 2])),
+}
+
+
+def _plan_problems(details: list) -> list:
+    problems = []
+    for detail in details:
+        if detail.startswith("SCAN ") and " USING " not in detail and "CONSTANT ROW" not in detail:
+            problems.append(detail)
+        elif "USE TEMP B-TREE" in detail:
+            problems.append(detail)
+    return problems
+
+
+async def check_query_plans(conn) -> dict:
+    """Return {query name: [offending plan lines]} for every hot query that doesn't use an index."""
+    if conn.dialect.name != "sqlite":
+        return {}
+    failures = {}
+    for name, stmt in HOT_QUERIES.items():
+        sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+        result = await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        problems = _plan_problems([row[-1] for row in result])
+        if problems:
+            failures[name] = problems
+    return failures
+
+
+async def warn_on_unindexed_queries(conn):
+    for name, problems in (await check_query_plans(conn)).items():
+        logger.warning("hot query %r is not using an index: %s", name, "; ".join(problems))
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import insert, select, tuple_
+
+from simulation import telemetry
+
+from .achievements import MISTAKE, PROMPT_SCORED, AchievementEvent, evaluate
+from .aggregates import record_scores
+from .cohorts import record_cohort_activity
+from .db import SessionLocal, settings, upsert_insert
+from .models import Mistake, PromptHistory
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "enqueue", "flush")
+_STOP = object()  # queued by stop(); everything ahead of it is flushed first
+
+WRITE_BEHIND_FLUSHES = telemetry.register(telemetry.Counter(
+    "promptquest_write_behind_flushes_total", "Write-behind batches committed."))
+WRITE_BEHIND_FLUSHED_EVENTS = telemetry.register(telemetry.Counter(
+    "promptquest_write_behind_flushed_events_total", "Analytics events committed by the write-behind buffer."))
+
+
+class WriteBufferFull(Exception):
+    """Raised when the queue stays full for longer than the enqueue timeout."""
+
+
+@dataclass
+class MistakeEvent:
+    user_id: int
+    topic: str
+    done: Optional[asyncio.Future] = field(default=None, compare=False)
+
+
+@dataclass
+class PromptEvent:
+    user_id: int
+    prompt_text: str
+    score: int
+    grade: str
+    grade_label: str
+    done: Optional[asyncio.Future] = field(default=None, compare=False)
+
+
+@dataclass
+class _Barrier:
+    """Resolves once every event queued before it has been committed."""
+    done: Optional[asyncio.Future] = None
+
+
+def _achievement_event(event) -> AchievementEvent:
+    if isinstance(event, MistakeEvent):
+        return AchievementEvent(event.user_id, MISTAKE, {"topic": event.topic})
+    return AchievementEvent(event.user_id, PROMPT_SCORED, {"score": event.score, "grade": event.grade})
+
+
+class WriteBehindBuffer:
+    """
+    Batches analytics events and writes each batch in a single transaction, so
+    SQLite fsyncs once per flush instead of once per request. A flush happens
+    every `interval_ms` or as soon as `max_batch` events are waiting.
+    """
+
+    def __init__(self, session_factory, mode: str = "flush", interval_ms: int = 25, max_batch: int = 500,
+                 max_queue: int = 10000, enqueue_timeout: float = 2.0):
+        if mode not in MODES:
+            raise ValueError(f"write-behind mode must be one of {MODES}, got {mode!r}")
+        self.session_factory = session_factory
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._stopping = False
+        self._on_awards = None  # async callable announcing committed badge awards
+        self.flushes = 0
+        self.flushed_events = 0
+
+    @property
+    def enabled(self) -> bool:
+        """
+        True while the writer task is running. Callers write directly otherwise
+        (mode "off", an app served without its startup hook, or during shutdown),
+        so a submitted event can never wait on a writer that isn't there.
+        """
+        return self.mode != "off" and self._task is not None and not self._task.done() and not self._stopping
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self, on_awards=None):
+        """Start the writer; `on_awards` is awaited with the badges each flush awarded."""
+        self._on_awards = on_awards
+        if self.mode != "off" and self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer task."""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def sync(self):
+        """Wait until everything queued so far is committed (e.g. before a reset deletes rows)."""
+        if self._task is None:
+            return
+        barrier = _Barrier(asyncio.get_running_loop().create_future())
+        await self._queue.put(barrier)
+        await barrier.done
+
+    async def submit(self, event):
+        """
+        Queue an event. In "flush" mode, wait until its batch has committed and
+        return the flush result (e.g. the new mistake count); in "enqueue" mode
+        return None as soon as it is queued.
+        """
+        if self.mode == "flush":
+            event.done = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                raise WriteBufferFull("Analytics write queue is full, try again shortly")
+        if event.done is not None:
+            return await event.done
+        return None
+
+    def _drain(self, batch: list) -> bool:
+        """Move already-queued events into the batch; return True if the stop marker was reached."""
+        while len(batch) < self.max_batch and not self._queue.empty():
+            event = self._queue.get_nowait()
+            if event is _STOP:
+                return True
+            batch.append(event)
+        return False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            event = await self._queue.get()
+            if event is _STOP:
+                return
+            batch = [event]
+            deadline = time.monotonic() + self.interval
+            stopping = self._drain(batch)
+            while not stopping and len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+                stopping = self._drain(batch)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        if not batch:
+            return
+        mistakes = [e for e in batch if isinstance(e, MistakeEvent)]
+        prompts = [e for e in batch if isinstance(e, PromptEvent)]
+        try:
+            async with self.session_factory() as db:
+                counts = await self._write_mistakes(db, mistakes) if mistakes else {}
+                if prompts:
+                    await self._write_prompts(db, prompts)
+                # Batch order is arrival order, so streak rules see each user's events in sequence
+                awards = await evaluate(db, [
+                    _achievement_event(e) for e in batch if isinstance(e, (MistakeEvent, PromptEvent))])
+                await db.commit()
+        except Exception as e:
+            logger.exception("write-behind flush of %d events failed", len(batch))
+            for event in batch:
+                if event.done is not None and not event.done.done():
+                    event.done.set_exception(e)
+            return
+
+        self.flushes += 1
+        self.flushed_events += len(mistakes) + len(prompts)
+        WRITE_BEHIND_FLUSHES.inc()
+        WRITE_BEHIND_FLUSHED_EVENTS.inc(amount=len(mistakes) + len(prompts))
+        for event in batch:
+            if event.done is not None and not event.done.done():
+                result = counts.get((event.user_id, event.topic)) if isinstance(event, MistakeEvent) else True
+                event.done.set_result(result)
+        if not awards or self._on_awards is None:
+            return
+        try:
+            await self._on_awards(awards)
+        except Exception:
+            logger.exception("announcing %d badge awards failed", len(awards))
+
+    async def _write_mistakes(self, db, events: list) -> dict:
+        increments = defaultdict(int)
+        for e in events:
+            increments[(e.user_id, e.topic)] += 1
+        stmt = upsert_insert(Mistake)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Mistake.user_id, Mistake.topic],
+            set_={"count": Mistake.count + stmt.excluded.count},
+        )
+        await db.execute(stmt, [{"user_id": u, "topic": t, "count": n} for (u, t), n in increments.items()])
+        await record_cohort_activity(db, mistakes=increments)
+
+        if self.mode != "flush":
+            return {}
+        result = await db.execute(
+            select(Mistake.user_id, Mistake.topic, Mistake.count)
+            .where(tuple_(Mistake.user_id, Mistake.topic).in_(list(increments)))
+        )
+        return {(u, t): count for u, t, count in result}
+
+    async def _write_prompts(self, db, events: list):
+        await db.execute(insert(PromptHistory), [
+            {"user_id": e.user_id, "prompt_text": e.prompt_text, "score": e.score,
+             "grade": e.grade, "grade_label": e.grade_label}
+            for e in events
+        ])
+        scores_by_user = defaultdict(list)
+        for e in events:
+            scores_by_user[e.user_id].append(e.score)
+        await record_scores(db, scores_by_user)
+        await record_cohort_activity(db, prompts=[(e.user_id, e.score, e.grade) for e in events])
+
+
+write_buffer = WriteBehindBuffer(
+    SessionLocal,
+    mode=settings.write_behind_mode,
+    interval_ms=settings.write_behind_interval_ms,
+    max_batch=settings.write_behind_max_batch,
+    max_queue=settings.write_behind_max_queue,
+    enqueue_timeout=settings.write_behind_enqueue_timeout,
+)
+
+telemetry.register(telemetry.Gauge(
+    "promptquest_write_behind_queue_depth", "Analytics events waiting to be flushed.", callback=lambda: write_buffer.depth))
@@ -1,6 +1,8 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import worlds, gamification, playground, ollama, analytics, rag, ws
+from starlette.routing import Match
+from routers import worlds, gamification, playground, ollama, analytics, cohorts, transfer, rag, ws, metrics
+from simulation import telemetry
 
 app = FastAPI(title="PromptQuest Ultimate API", version="2.0.0")
 
@@ -13,6 +15,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(request: Request) -> str:
+    """The path template of the route that will serve the request, so metric labels stay bounded."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+@app.middleware("http")
+async def tag_route(request: Request, call_next):
+    # Lets per-route metrics (e.g. Ollama inference timings) know which endpoint they serve.
+    # Routing runs after middleware, so the template is matched here rather than read from scope.
+    telemetry.current_route.set(route_template(request))
+    return await call_next(request)
+
 # Existing routes
 app.include_router(worlds.router, prefix="/api/worlds", tags=["Worlds"])
 app.include_router(playground.router, prefix="/api/playground", tags=["Playground"])
@@ -21,30 +42,64 @@ app.include_router(gamification.router, prefix="/api/gamification", tags=["Gamif
 # New routes
 app.include_router(ollama.router, prefix="/api/ollama", tags=["Ollama / Real AI"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(transfer.router, prefix="/api/analytics", tags=["Analytics Export"])
+app.include_router(cohorts.router, prefix="/api/cohorts", tags=["Cohorts"])
 app.include_router(rag.router, prefix="/api/rag", tags=["RAG Vector DB"])
 app.include_router(ws.router, prefix="/ws", tags=["WebSockets"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 from database.db import engine, Base
+from database.migrations import run_migrations
+from database.query_plans import warn_on_unindexed_queries
+from database.aggregates import backfill_score_stats
+from database.cohorts import prune_cohort_counters
+from database.leaderboard import leaderboard
+from database.write_behind import write_buffer
+from realtime.pubsub import bus
+from routers.ws import announce_awards, manager as ws_manager
+from routers.static_response import StaticJSON
 
 @app.on_event("startup")
 async def startup_event():
     # Initialize SQLite tables
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
+        await backfill_score_stats(conn)
+        await prune_cohort_counters(conn)
+        await warn_on_unindexed_queries(conn)
+        await leaderboard.load(conn)
+    write_buffer.start(on_awards=announce_awards)
+    await bus.start()
+    ws_manager.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Commit any analytics events still waiting in the write-behind queue
+    await write_buffer.stop()
+    await bus.stop()
+    await ws_manager.stop()
+
+
+ROOT_RESPONSE = StaticJSON({
+    "message": "Welcome to PromptQuest Ultimate API 🚀",
+    "institution": "Anurag University",
+    "version": "2.0.0",
+    "worlds": 6,
+    "features": ["simulation", "ollama", "analytics", "gamification"],
+    "docs": "/docs"
+}, cache_control="no-cache")
+
+# no-cache: monitors always revalidate, but a live server answers with a bodiless 304
+HEALTH_RESPONSE = StaticJSON({"status": "ok", "version": "2.0.0"}, cache_control="no-cache")
 
 
 @app.get("/")
-async def root():
-    return {
-        "message": "Welcome to PromptQuest Ultimate API 🚀",
-        "institution": "Anurag University",
-        "version": "2.0.0",
-        "worlds": 6,
-        "features": ["simulation", "ollama", "analytics", "gamification"],
-        "docs": "/docs"
-    }
+async def root(request: Request):
+    return ROOT_RESPONSE.response(request)
 
 
 @app.get("/health")
-async def health():
-    return {"status": "ok", "version": "2.0.0"}
+async def health(request: Request):
+    return HEALTH_RESPONSE.response(request)
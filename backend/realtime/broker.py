@@ -0,0 +1,77 @@
+"""
+Minimal pub/sub broker for running several API workers.
+
+Every connection both publishes and subscribes: each newline-delimited frame
+received is forwarded, in arrival order, to every connected worker (the
+sender included). Point the workers at it with PROMPTQUEST_PUBSUB_URL:
+
+    python -m realtime.broker unix:///tmp/promptquest.sock &
+    PROMPTQUEST_PUBSUB_URL=unix:///tmp/promptquest.sock uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import os
+from urllib.parse import urlparse
+
+logger = logging.getLogger("realtime.broker")
+
+# Frames buffered per worker before the broker drops the connection
+MAX_PENDING_BYTES = 8 * 1024 * 1024
+
+
+class Broker:
+    def __init__(self):
+        self.peers = set()
+        self.forwarded = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.peers.add(writer)
+        logger.info("worker connected (%d total)", len(self.peers))
+        try:
+            while line := await reader.readline():
+                self.forwarded += 1
+                for peer in list(self.peers):
+                    if peer.transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+                        logger.warning("dropping worker that stopped reading")
+                        self.peers.discard(peer)
+                        peer.close()
+                        continue
+                    peer.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.peers.discard(writer)
+            writer.close()
+            logger.info("worker disconnected (%d total)", len(self.peers))
+
+
+async def serve(url: str):
+    broker = Broker()
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        if os.path.exists(parsed.path):
+            os.unlink(parsed.path)
+        server = await asyncio.start_unix_server(broker.handle, path=parsed.path)
+    elif parsed.scheme == "tcp":
+        server = await asyncio.start_server(broker.handle, parsed.hostname, parsed.port)
+    else:
+        raise SystemExit(f"Unsupported URL {url!r}; use unix:///path or tcp://host:port")
+    logger.info("pub/sub broker listening on %s", url)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pub/sub broker for multi-worker WebSocket fan-out.")
+    parser.add_argument("url", nargs="?", default="unix:///tmp/promptquest.sock")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        asyncio.run(serve(args.url))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Pub/sub bus for realtime events.
+
+Every worker publishes to the bus and relays what it receives to its own
+WebSocket clients, so an event raised in one uvicorn worker reaches sockets
+held by all of them. Backends, selected by PROMPTQUEST_PUBSUB_URL:
+
+    memory://                      in-process only (default; single worker)
+    unix:///tmp/promptquest.sock   broker from `python -m realtime.broker`
+    tcp://127.0.0.1:7390           same broker over TCP
+
+Ordering: a worker hands a channel's messages to subscribers one at a time,
+in the order the bus delivered them. The broker forwards frames in arrival
+order to every connection, so all workers see each user's events in the
+same order.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from simulation import telemetry
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_URL = os.getenv("PROMPTQUEST_PUBSUB_URL", "memory://")
+RECONNECT_MAX_SECONDS = 5.0
+
+BUS_PUBLISHED = telemetry.register(telemetry.Counter(
+    "promptquest_pubsub_published_total", "Messages published to the realtime bus.", ("backend",)))
+BUS_LOCAL_FALLBACK = telemetry.register(telemetry.Counter(
+    "promptquest_pubsub_local_fallback_total", "Messages delivered locally only because the broker was unreachable."))
+
+
+def encode_frame(channel: str, message: dict) -> bytes:
+    return (json.dumps({"channel": channel, "data": message}, separators=(",", ":")) + "\n").encode()
+
+
+def decode_frame(line: bytes):
+    frame = json.loads(line)
+    return frame["channel"], frame["data"]
+
+
+async def open_connection(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path)
+    if parsed.scheme == "tcp":
+        return await asyncio.open_connection(parsed.hostname, parsed.port)
+    raise ValueError(f"Unsupported pub/sub URL: {url}")
+
+
+class InProcessPubSub:
+    """Delivers straight to this process's subscribers."""
+
+    backend = "memory"
+
+    def __init__(self):
+        self._handlers = defaultdict(list)
+
+    def subscribe(self, channel: str, handler):
+        self._handlers[channel].append(handler)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, message: dict):
+        BUS_PUBLISHED.inc(self.backend)
+        await self._dispatch(channel, message)
+
+    async def _dispatch(self, channel: str, message: dict):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                await handler(message)
+            except Exception:
+                logger.exception("pub/sub handler for %r failed", channel)
+
+
+class BrokerPubSub(InProcessPubSub):
+    """
+    Newline-delimited JSON over one connection to the broker. Our own messages
+    come back from the broker like everyone else's, so local and remote
+    subscribers see the same order.
+    """
+
+    backend = "broker"
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self._writer = None
+        self._task = None
+        self._connected = asyncio.Event()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            try:
+                await asyncio.wait_for(self._connected.wait(), 2.0)
+            except asyncio.TimeoutError:
+                logger.warning("pub/sub broker %s not reachable yet; delivering locally until it is", self.url)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, channel: str, message: dict):
+        writer = self._writer
+        if writer is None:
+            BUS_LOCAL_FALLBACK.inc()
+            await self._dispatch(channel, message)
+            return
+        # write() is synchronous, so frames leave in the order publish() was called
+        try:
+            writer.write(encode_frame(channel, message))
+            await writer.drain()
+        except (OSError, RuntimeError) as e:
+            # The caller has usually committed already: never fail it, deliver locally instead
+            logger.warning("pub/sub publish failed, broker marked down: %r", e)
+            self._mark_down(writer)
+            BUS_LOCAL_FALLBACK.inc()
+            await self._dispatch(channel, message)
+            return
+        BUS_PUBLISHED.inc(self.backend)
+
+    def _mark_down(self, writer):
+        """Stop publishing through a broken connection; closing it makes _run reconnect."""
+        if self._writer is writer:
+            self._writer = None
+            self._connected.clear()
+        writer.close()
+
+    async def _run(self):
+        delay = 0.1
+        while True:
+            try:
+                reader, writer = await open_connection(self.url)
+            except OSError as e:
+                logger.debug("pub/sub broker connect failed: %r", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                continue
+            delay = 0.1
+            self._writer = writer
+            self._connected.set()
+            try:
+                while line := await reader.readline():
+                    channel, message = decode_frame(line)
+                    await self._dispatch(channel, message)
+            except (OSError, ValueError) as e:
+                logger.warning("pub/sub broker connection lost: %r", e)
+            finally:
+                self._writer = None
+                self._connected.clear()
+                writer.close()
+
+
+def create_bus(url: str = PUBSUB_URL):
+    if url.startswith("memory"):
+        return InProcessPubSub()
+    return BrokerPubSub(url)
+
+
+bus = create_bus()
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime
+from sqlalchemy import delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from database.db import get_db
-from database.models import User, Mistake, PromptHistory
-from routers.gamification import get_current_user
+from database.achievements import MISTAKE, PROMPT_SCORED, AchievementEvent, evaluate
+from database.aggregates import range_score_stats, rebuild_score_stats, record_score, stats_payload
+from database.chart_series import DEFAULT_POINTS as DEFAULT_CHART_POINTS, chart_series
+from database.cohorts import record_cohort_activity
+from database.db import get_db, get_read_db, upsert_insert
+from database.identity import Identity
+from database.write_behind import MistakeEvent, PromptEvent, WriteBufferFull, write_buffer
+from database.models import Mistake, PromptHistory, PromptScoreStats
+from routers.gamification import get_current_user, require_admin
+from routers.ws import announce_awards
 
 router = APIRouter()
 
@@ -20,34 +29,48 @@ class PromptHistoryRecord(BaseModel):
     grade: str
     grade_label: str
 
+async def _submit(event):
+    """Hand an event to the write-behind buffer, turning backpressure into a 503."""
+    try:
+        return await write_buffer.submit(event)
+    except WriteBufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
 @router.post("/mistake")
-async def record_mistake(record: MistakeRecord, db: AsyncSession = Depends(get_db)):
+async def record_mistake(record: MistakeRecord, user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Record a mistake for a topic."""
-    user = await get_current_user(db)
     topic = record.topic.lower().strip()
+
+    if write_buffer.enabled:
+        # None in "enqueue" mode, where we ack before the count is known
+        total_mistakes = await _submit(MistakeEvent(user.id, topic))
+        return {
+            "topic": topic,
+            "total_mistakes": total_mistakes,
+            "message": f"Mistake recorded in {topic}."
+        }
     
-    result = await db.execute(select(Mistake).where(Mistake.user_id == user.id, Mistake.topic == topic))
-    mistake = result.scalar_one_or_none()
-    
-    if mistake:
-        mistake.count += 1
-    else:
-        mistake = Mistake(user_id=user.id, topic=topic, count=1)
-        db.add(mistake)
-        
+    # Single-statement upsert: no read-modify-write race between concurrent requests
+    stmt = upsert_insert(Mistake).values(user_id=user.id, topic=topic, count=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Mistake.user_id, Mistake.topic],
+        set_={"count": Mistake.count + 1},
+    ).returning(Mistake.count)
+    total_mistakes = (await db.execute(stmt)).scalar_one()
+    await record_cohort_activity(db, mistakes={(user.id, topic): 1})
+    awards = await evaluate(db, [AchievementEvent(user.id, MISTAKE, {"topic": topic})])
     await db.commit()
-    await db.refresh(mistake)
+    await announce_awards(awards)
     
     return {
         "topic": topic,
-        "total_mistakes": mistake.count,
+        "total_mistakes": total_mistakes,
         "message": f"Mistake recorded in {topic}."
     }
 
 @router.get("/summary")
-async def get_summary(db: AsyncSession = Depends(get_db)):
+async def get_summary(user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
     """Return mistake counts per topic."""
-    user = await get_current_user(db)
     result = await db.execute(select(Mistake).where(Mistake.user_id == user.id))
     mistakes = result.scalars().all()
     
@@ -63,10 +86,12 @@ async def get_summary(db: AsyncSession = Depends(get_db)):
     }
 
 @router.post("/prompt-history")
-async def save_prompt_history(record: PromptHistoryRecord, db: AsyncSession = Depends(get_db)):
+async def save_prompt_history(record: PromptHistoryRecord, user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Save a prompt score to history."""
-    user = await get_current_user(db)
-    
+    if write_buffer.enabled:
+        await _submit(PromptEvent(user.id, record.prompt[:200], record.score, record.grade, record.grade_label))
+        return {"saved": True, "message": "Prompt saved to history."}
+
     entry = PromptHistory(
         user_id=user.id,
         prompt_text=record.prompt[:200],
@@ -75,66 +100,193 @@ async def save_prompt_history(record: PromptHistoryRecord, db: AsyncSession = De
         grade_label=record.grade_label
     )
     db.add(entry)
+    await record_score(db, user.id, record.score)
+    await record_cohort_activity(db, prompts=[(user.id, record.score, record.grade)])
+    awards = await evaluate(db, [AchievementEvent(user.id, PROMPT_SCORED, {"score": record.score, "grade": record.grade})])
     await db.commit()
+    await announce_awards(awards)
     
     return {"saved": True, "message": "Prompt saved to history."}
 
+# Columns a client may request via ?fields=; the id is always returned since it is the page cursor
+HISTORY_FIELDS = {
+    "id": PromptHistory.id,
+    "prompt": PromptHistory.prompt_text,
+    "score": PromptHistory.score,
+    "grade": PromptHistory.grade,
+    "grade_label": PromptHistory.grade_label,
+    "timestamp": PromptHistory.created_at,
+}
+
+def _parse_fields(fields: Optional[str]) -> list:
+    if not fields:
+        return list(HISTORY_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in HISTORY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in requested if f != "id"]
+
+async def _load_stats(db: AsyncSession, user_id: int) -> Optional[dict]:
+    stats = await db.get(PromptScoreStats, user_id)
+    if stats is None or not stats.count:
+        return None
+    return stats_payload(stats)
+
+async def _history_stats(db: AsyncSession, user_id: int, chart_points: int, chart_mode: str,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Aggregate stats plus the (downsampled, cached) chart series. The whole
+    history is served from the running per-user table; a since/until range is
+    folded from just the rows inside it.
+    """
+    row = await db.get(PromptScoreStats, user_id)
+    if row is None or not row.count:
+        return None
+    version = (row.count, row.total)
+    if since is not None or until is not None:
+        row = await range_score_stats(db, user_id, since, until)
+        if not row.count:
+            return None
+    stats = stats_payload(row)
+    stats["chart_data"] = await chart_series(db, user_id, version, chart_points, chart_mode, since, until)
+    stats["chart_mode"] = chart_mode
+    return stats
+
+async def _history_positions(db: AsyncSession, user_id: int, ids: list, filtered: bool) -> dict:
+    """
+    Map history ids to their 1-based position in the user's whole history, so
+    `index` stays absolute across pages. One COUNT over the (user_id, id) index
+    gives the first row's position; the rest of an unfiltered page is contiguous,
+    a date-filtered one may skip rows, so its id span is read from the index.
+    """
+    if not ids:
+        return {}
+    first_id, last_id = min(ids), max(ids)
+    before = (await db.execute(
+        select(func.count()).where(PromptHistory.user_id == user_id, PromptHistory.id < first_id)
+    )).scalar_one()
+    if filtered:
+        span = (await db.execute(
+            select(PromptHistory.id).where(PromptHistory.user_id == user_id, PromptHistory.id.between(first_id, last_id))
+            .order_by(PromptHistory.id)
+        )).scalars()
+    else:
+        span = sorted(ids)
+    return {history_id: before + i + 1 for i, history_id in enumerate(span)}
+
+@router.get("/stats")
+async def get_prompt_stats(user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    """Return prompt score stats (count, best, worst, averages, trend, streaks) in O(1)."""
+    return {"stats": await _load_stats(db, user.id)}
+
 @router.get("/prompt-history")
-async def get_prompt_history(db: AsyncSession = Depends(get_db)):
-    """Return all saved prompt scores."""
-    user = await get_current_user(db)
-    result = await db.execute(select(PromptHistory).where(PromptHistory.user_id == user.id).order_by(PromptHistory.id))
-    history = result.scalars().all()
-    
-    if not history:
-        return {"history": [], "stats": None}
+async def get_prompt_history(
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; without it the whole history is returned"),
+    cursor: Optional[int] = Query(None, description="Return rows after this id (in the chosen order)"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated subset of: " + ", ".join(HISTORY_FIELDS)),
+    include_stats: bool = Query(True, description="Stats are only computed for the first page"),
+    chart_points: int = Query(DEFAULT_CHART_POINTS, ge=3, le=5000, description="Target number of chart_data points"),
+    chart_mode: str = Query("lttb", pattern="^(lttb|time)$",
+                            description="lttb: shape-preserving sample; time: time buckets with min/avg/max"),
+    user: Identity = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Return saved prompt scores: the whole history, or one keyset-paginated page when `limit` is given."""
+    names = _parse_fields(fields)
+    query = select(*(HISTORY_FIELDS[n] for n in names)).where(PromptHistory.user_id == user.id)
+    if cursor is not None:
+        query = query.where(PromptHistory.id > cursor if order == "asc" else PromptHistory.id < cursor)
+    if since is not None:
+        query = query.where(PromptHistory.created_at >= since)
+    if until is not None:
+        query = query.where(PromptHistory.created_at < until)
+    query = query.order_by(PromptHistory.id if order == "asc" else PromptHistory.id.desc())
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit]
 
-    scores = [h.score for h in history]
+    positions = await _history_positions(db, user.id, [row[0] for row in rows], since is not None or until is not None)
     history_list = []
-    for i, h in enumerate(history):
-        history_list.append({
-            "prompt": h.prompt_text,
-            "score": h.score,
-            "grade": h.grade,
-            "grade_label": h.grade_label,
-            "timestamp": h.created_at.isoformat() if h.created_at else None,
-            "index": i + 1
-        })
-        
-    trend = "steady"
-    if len(scores) >= 3:
-        if scores[-1] > scores[-3]: trend = "improving"
-        elif scores[-1] < scores[-3]: trend = "declining"
+    for row in rows:
+        item = dict(zip(names, row))
+        if "timestamp" in item:
+            item["timestamp"] = item["timestamp"].isoformat() if item["timestamp"] else None
+        item["index"] = positions[item["id"]]
+        history_list.append(item)
 
+    stats = None
+    if include_stats and cursor is None:
+        stats = await _history_stats(db, user.id, chart_points, chart_mode, since, until)
     return {
         "history": history_list,
-        "stats": {
-            "count": len(scores),
-            "best": max(scores),
-            "worst": min(scores),
-            "average": round(sum(scores) / len(scores), 1),
-            "trend": trend,
-            "chart_data": [{"x": i+1, "y": s, "grade": g} for i, (s, g) in enumerate(zip(scores, [h.grade for h in history]))]
-        }
+        "stats": stats,
+        "next_cursor": rows[-1][0] if has_more else None,
     }
 
+class BulkResetRequest(BaseModel):
+    user_ids: List[int]
+    topic: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+async def _reset_users(db: AsyncSession, user_ids: list, topic: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None) -> dict:
+    """
+    Set-based deletes for one or many users. `topic` scopes the mistake reset and
+    since/until scope the prompt-history reset; with no scope, both are cleared.
+    """
+    await write_buffer.sync()  # don't let queued events land after the delete
+    scoped = topic is not None or since is not None or until is not None
+    deleted = {"mistakes": 0, "prompt_history": 0}
+
+    if topic is not None or not scoped:
+        stmt = delete(Mistake).where(Mistake.user_id.in_(user_ids))
+        if topic is not None:
+            stmt = stmt.where(Mistake.topic == topic.lower().strip())
+        deleted["mistakes"] = (await db.execute(stmt.execution_options(synchronize_session=False))).rowcount
+
+    if since is not None or until is not None or not scoped:
+        stmt = delete(PromptHistory).where(PromptHistory.user_id.in_(user_ids))
+        if since is not None:
+            stmt = stmt.where(PromptHistory.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(PromptHistory.created_at < until)
+        deleted["prompt_history"] = (await db.execute(stmt.execution_options(synchronize_session=False))).rowcount
+        if not scoped:
+            await db.execute(delete(PromptScoreStats).where(PromptScoreStats.user_id.in_(user_ids)))
+        elif deleted["prompt_history"]:
+            await rebuild_score_stats(db, user_ids)
+
+    return deleted
+
 @router.delete("/reset")
-async def reset_analytics(db: AsyncSession = Depends(get_db)):
-    """Reset all analytics (for testing)."""
-    user = await get_current_user(db)
-    
-    # Delete mistakes
-    mistakes = await db.execute(select(Mistake).where(Mistake.user_id == user.id))
-    for m in mistakes.scalars().all():
-        await db.delete(m)
-        
-    # Delete prompt history
-    prompts = await db.execute(select(PromptHistory).where(PromptHistory.user_id == user.id))
-    for p in prompts.scalars().all():
-        await db.delete(p)
-        
+async def reset_analytics(
+    topic: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user: Identity = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Reset analytics, optionally only one topic's mistakes or a date range of prompt history."""
+    deleted = await _reset_users(db, [user.id], topic, since, until)
+    await db.commit()
+    return {"reset": True, "deleted": deleted}
+
+@router.post("/admin/reset", dependencies=[Depends(require_admin)])
+async def bulk_reset_analytics(data: BulkResetRequest, db: AsyncSession = Depends(get_db)):
+    """Reset analytics for many users in a single transaction (admin only)."""
+    if not data.user_ids:
+        raise HTTPException(status_code=422, detail="user_ids must not be empty")
+    deleted = await _reset_users(db, data.user_ids, data.topic, data.since, data.until)
     await db.commit()
-    return {"reset": True}
+    return {"reset": True, "users": len(set(data.user_ids)), "deleted": deleted}
 
 def _generate_suggestions(mistakes_dict: dict) -> list:
     suggestions = []
@@ -0,0 +1,136 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from typing import List
+from sqlalchemy import delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database.cohorts import (
+    KIND_GRADE, KIND_SCORE, KIND_TOPIC, SCORE_BUCKET_WIDTH, WINDOW_DAYS, cohort_cache, counter_totals,
+)
+from database.db import get_db, get_read_db, upsert_insert
+from database.models import Cohort, CohortMember, User
+from routers.gamification import require_admin
+
+# Instructor dashboards: every route needs the admin token
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+class CohortCreate(BaseModel):
+    name: str
+
+class CohortMembers(BaseModel):
+    user_ids: List[int]
+
+async def _get_cohort(db: AsyncSession, cohort_id: int) -> Cohort:
+    cohort = await db.get(Cohort, cohort_id)
+    if cohort is None:
+        raise HTTPException(status_code=404, detail="Cohort not found")
+    return cohort
+
+async def _cached(db: AsyncSession, key: tuple, build):
+    """Serve a dashboard payload from the TTL cache, building it from the counters on a miss."""
+    payload = cohort_cache.get(key)
+    if payload is None:
+        await _get_cohort(db, key[0])
+        payload = await build()
+        cohort_cache.put(key, payload)
+    return payload
+
+@router.post("")
+async def create_cohort(data: CohortCreate, db: AsyncSession = Depends(get_db)):
+    """Create a cohort (e.g. one class section)."""
+    name = data.name.strip()
+    if not name:
+        raise HTTPException(status_code=422, detail="Cohort name is required")
+    cohort = Cohort(name=name)
+    db.add(cohort)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Cohort already exists")
+    await db.refresh(cohort)
+    return {"id": cohort.id, "name": name}
+
+@router.get("")
+async def list_cohorts(db: AsyncSession = Depends(get_read_db)):
+    """List cohorts with their member counts."""
+    result = await db.execute(
+        select(Cohort.id, Cohort.name, func.count(CohortMember.user_id))
+        .outerjoin(CohortMember, CohortMember.cohort_id == Cohort.id)
+        .group_by(Cohort.id, Cohort.name).order_by(Cohort.id)
+    )
+    return [{"id": cohort_id, "name": name, "members": members} for cohort_id, name, members in result]
+
+@router.post("/{cohort_id}/members")
+async def add_members(cohort_id: int, data: CohortMembers, db: AsyncSession = Depends(get_db)):
+    """Add students to a cohort. Counters include their activity from this point on."""
+    await _get_cohort(db, cohort_id)
+    if not data.user_ids:
+        return {"added": 0}
+    user_ids = set(data.user_ids)
+    # Checked explicitly: SQLite (the default backend) doesn't enforce the foreign key
+    known = set((await db.execute(select(User.id).where(User.id.in_(user_ids)))).scalars())
+    if known != user_ids:
+        missing = ", ".join(str(u) for u in sorted(user_ids - known))
+        raise HTTPException(status_code=404, detail=f"Unknown user id: {missing}")
+    stmt = upsert_insert(CohortMember).values([{"cohort_id": cohort_id, "user_id": u} for u in user_ids])
+    stmt = stmt.on_conflict_do_nothing(index_elements=[CohortMember.user_id, CohortMember.cohort_id])
+    try:
+        added = (await db.execute(stmt.returning(CohortMember.user_id))).scalars().all()
+        await db.commit()
+    except IntegrityError:
+        # A user deleted between the check and the insert (PostgreSQL enforces the key)
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Unknown user id")
+    cohort_cache.invalidate(cohort_id)
+    return {"added": len(added)}
+
+@router.delete("/{cohort_id}/members/{user_id}")
+async def remove_member(cohort_id: int, user_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        delete(CohortMember).where(CohortMember.cohort_id == cohort_id, CohortMember.user_id == user_id)
+    )
+    await db.commit()
+    cohort_cache.invalidate(cohort_id)
+    return {"removed": result.rowcount}
+
+@router.get("/{cohort_id}/weak-topics")
+async def weak_topics(cohort_id: int, days: int = Query(WINDOW_DAYS, ge=1, le=90), limit: int = Query(5, ge=1, le=50),
+                      db: AsyncSession = Depends(get_read_db)):
+    """Topics with the most mistakes across the cohort over the last `days` days."""
+    async def build():
+        totals = await counter_totals(db, cohort_id, KIND_TOPIC, days)
+        total = sum(totals.values())
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return {
+            "cohort_id": cohort_id,
+            "days": days,
+            "total_mistakes": total,
+            "topics": [{"topic": t, "mistakes": n, "share": round(n / total, 3)} for t, n in ranked],
+        }
+    return await _cached(db, (cohort_id, "weak-topics", days, limit), build)
+
+@router.get("/{cohort_id}/grades")
+async def grade_distribution(cohort_id: int, days: int = Query(WINDOW_DAYS, ge=1, le=90),
+                             db: AsyncSession = Depends(get_read_db)):
+    """Prompt grades across the cohort over the last `days` days."""
+    async def build():
+        totals = await counter_totals(db, cohort_id, KIND_GRADE, days)
+        return {"cohort_id": cohort_id, "days": days, "total_prompts": sum(totals.values()),
+                "grades": dict(sorted(totals.items()))}
+    return await _cached(db, (cohort_id, "grades", days), build)
+
+@router.get("/{cohort_id}/score-histogram")
+async def score_histogram(cohort_id: int, days: int = Query(WINDOW_DAYS, ge=1, le=90),
+                          db: AsyncSession = Depends(get_read_db)):
+    """Prompt scores across the cohort in 10-point buckets over the last `days` days."""
+    async def build():
+        totals = await counter_totals(db, cohort_id, KIND_SCORE, days)
+        buckets = []
+        for low in range(0, 100, SCORE_BUCKET_WIDTH):
+            high = 100 if low + SCORE_BUCKET_WIDTH >= 100 else low + SCORE_BUCKET_WIDTH - 1
+            buckets.append({"range": f"{low}-{high}", "count": totals.get(str(low), 0)})
+        return {"cohort_id": cohort_id, "days": days, "total_prompts": sum(totals.values()), "buckets": buckets}
+    return await _cached(db, (cohort_id, "score-histogram", days), build)
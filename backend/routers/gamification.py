@@ -1,9 +1,25 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from bisect import bisect_right
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from database.db import get_db
-from database.models import User, CompletedWorld
+from database.achievements import (
+    BADGES, WORLD_COMPLETED, XP, AchievementEvent, evaluate, user_achievements,
+)
+from database.db import ReadSessionLocal, SessionLocal, get_db, get_read_db, upsert_insert
+from database.identity import (
+    DEFAULT_USERNAME, TOKEN_COOKIE, TOKEN_TTL_SECONDS, Identity, check_password, hash_password, identity_cache,
+    is_admin_request, issue_token, token_from_request, verify_token,
+)
+from database.leaderboard import leaderboard
+from database.models import User, CompletedWorld, UserBadge, UserCredential
+from routers.static_response import StaticJSON
 
 router = APIRouter()
 
@@ -20,91 +36,272 @@ LEVELS = [
     {"level": 10, "title": "Expert", "min_xp": 3200, "max_xp": 9999, "color": "#D4A017"},
 ]
 
-BADGES = [
-    {"id": "ai_explorer", "name": "AI Explorer", "description": "Completed World 1", "icon": "🔍", "world": 1},
-    {"id": "prediction_pro", "name": "Prediction Pro", "description": "Completed World 2", "icon": "📊", "world": 2},
-    {"id": "token_master", "name": "Token Master", "description": "Completed World 3", "icon": "🔤", "world": 3},
-    {"id": "prompt_master", "name": "Prompt Master", "description": "Completed World 4", "icon": "✍️", "world": 4},
-    {"id": "truth_seeker", "name": "Truth Seeker", "description": "Completed World 5", "icon": "🕵️", "world": 5},
-    {"id": "ai_trainer", "name": "AI Trainer", "description": "Completed World 6", "icon": "🏋️", "world": 6},
-    {"id": "context_wizard", "name": "Context Wizard", "description": "Completed World 7", "icon": "🧠", "world": 7},
-]
+
+# Level thresholds compiled once: compute_level bisects them instead of scanning LEVELS
+_LEVEL_THRESHOLDS = [lv["min_xp"] for lv in LEVELS]
+_LEVEL_TABLE = []  # per level: (level dict, next_level_xp, xp span used for progress)
+for _lv in LEVELS:
+    _next_xp = LEVELS[min(_lv["level"], len(LEVELS) - 1)]["max_xp"]
+    _LEVEL_TABLE.append((_lv, _next_xp, max(1, _next_xp - _lv["min_xp"])))
 
 def compute_level(xp: int) -> dict:
-    for lv in reversed(LEVELS):
-        if xp >= lv["min_xp"]:
-            next_lv = LEVELS[min(lv["level"], len(LEVELS) - 1)]
-            progress = ((xp - lv["min_xp"]) / max(1, (next_lv["max_xp"] - lv["min_xp"]))) * 100
-            return {
-                **lv,
-                "current_xp": xp,
-                "next_level_xp": next_lv["max_xp"],
-                "progress_percent": min(100, round(progress, 1))
-            }
-    return {**LEVELS[0], "current_xp": xp, "next_level_xp": 100, "progress_percent": 0}
-
-async def get_current_user(db: AsyncSession):
-    # Always fetch/create default user for now (id=1)
-    result = await db.execute(select(User).where(User.id == 1))
-    user = result.scalar_one_or_none()
-    if not user:
-        user = User(id=1, username="student", xp=0)
+    index = bisect_right(_LEVEL_THRESHOLDS, xp) - 1
+    if index < 0:
+        return {**LEVELS[0], "current_xp": xp, "next_level_xp": 100, "progress_percent": 0}
+    lv, next_level_xp, span = _LEVEL_TABLE[index]
+    progress = ((xp - lv["min_xp"]) / span) * 100
+    return {
+        **lv,
+        "current_xp": xp,
+        "next_level_xp": next_level_xp,
+        "progress_percent": min(100, round(progress, 1))
+    }
+
+LEVELS_RESPONSE = StaticJSON(LEVELS)
+BADGES_RESPONSE = StaticJSON(BADGES)
+
+MIN_PASSWORD_LENGTH = 8
+
+class UsernameRequest(BaseModel):
+    username: str
+
+class LoginRequest(UsernameRequest):
+    password: str
+
+class PasswordRequest(BaseModel):
+    password: str
+
+def _identity(user: User) -> Identity:
+    return Identity(id=user.id, username=user.username, xp=user.xp or 0)
+
+# Identity lookups use their own short-lived sessions so they never hold a
+# transaction (and SQLite's write lock) open for the rest of the request.
+async def _load_or_create_user(username: str) -> Identity:
+    async with ReadSessionLocal() as db:
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalar_one_or_none()
+        if user:
+            return _identity(user)
+    async with SessionLocal() as db:
+        user = User(username=username, xp=0)
         db.add(user)
-        await db.commit()
-        await db.refresh(user)
+        try:
+            await db.commit()
+            await db.refresh(user)
+        except IntegrityError:
+            # Another request created the same username first
+            await db.rollback()
+            result = await db.execute(select(User).where(User.username == username))
+            user = result.scalar_one()
+        return _identity(user)
+
+async def _load_user(user_id: int) -> Optional[Identity]:
+    async with ReadSessionLocal() as db:
+        user = await db.get(User, user_id)
+        return _identity(user) if user else None
+
+async def get_current_user(request: Request) -> Identity:
+    """
+    Resolve the caller from a bearer token or the session cookie.
+    Requests without a token act as the shared default student. Identities are
+    memoized per request and in the process-level cache, so the common case
+    costs no DB round trip.
+    """
+    cached = getattr(request.state, "user", None)
+    if cached is not None:
+        return cached
+
+    token = token_from_request(request)
+    if token:
+        user_id = verify_token(token)
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid session token")
+        user = identity_cache.get(user_id)
+        if user is None:
+            user = await _load_user(user_id)
+            if user is None:
+                raise HTTPException(status_code=401, detail="Unknown user")
+            identity_cache.put(user)
+    else:
+        user = identity_cache.get_by_username(DEFAULT_USERNAME)
+        if user is None:
+            user = await _load_or_create_user(DEFAULT_USERNAME)
+            identity_cache.put(user)
+
+    request.state.user = user
     return user
 
+def require_admin(request: Request):
+    """Dependency guarding instructor/admin endpoints with the X-Admin-Token header."""
+    if not is_admin_request(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+def _check_password_length(password: str):
+    if len(password) < MIN_PASSWORD_LENGTH:
+        raise HTTPException(status_code=422, detail=f"Password must be at least {MIN_PASSWORD_LENGTH} characters")
+
+async def _create_account(username: str, password: str) -> Identity:
+    _check_password_length(password)
+    password_hash = await asyncio.to_thread(hash_password, password)
+    async with SessionLocal() as db:
+        user = User(username=username, xp=0)
+        db.add(user)
+        try:
+            await db.flush()
+            db.add(UserCredential(user_id=user.id, password_hash=password_hash))
+            await db.commit()
+            await db.refresh(user)
+        except IntegrityError:
+            # Another request registered the same username first
+            await db.rollback()
+            raise HTTPException(status_code=401, detail="Invalid username or password")
+        return _identity(user)
+
+async def _authenticate(username: str, password: str) -> Identity:
+    """Check a password against the stored hash; an unknown username is registered with it."""
+    async with ReadSessionLocal() as db:
+        row = (await db.execute(
+            select(User, UserCredential.password_hash)
+            .outerjoin(UserCredential, UserCredential.user_id == User.id)
+            .where(User.username == username)
+        )).first()
+    if row is None:
+        return await _create_account(username, password)
+    user, password_hash = row
+    if password_hash is None:
+        raise HTTPException(status_code=401, detail="This account has no password yet; ask an instructor to set one")
+    if not await asyncio.to_thread(check_password, password, password_hash):
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    return _identity(user)
+
+@router.post("/login")
+async def login(data: LoginRequest, response: Response):
+    """Sign in with a username and password (registering the username on first use) and return a session token."""
+    username = data.username.strip()
+    if not username:
+        raise HTTPException(status_code=422, detail="Username is required")
+    user = await _authenticate(username, data.password)
+    identity_cache.put(user)
+    leaderboard.update(user.id, user.username, user.xp)
+    token = issue_token(user.id)
+    response.set_cookie(TOKEN_COOKIE, token, httponly=True, samesite="lax", max_age=TOKEN_TTL_SECONDS)
+    return {"token": token, "user_id": user.id, "username": user.username, "xp": user.xp,
+            "expires_in": TOKEN_TTL_SECONDS}
+
+@router.put("/users/{user_id}/password", dependencies=[Depends(require_admin)])
+async def set_password(user_id: int, data: PasswordRequest, db: AsyncSession = Depends(get_db)):
+    """Set or reset a user's password (admin only), e.g. for accounts created before passwords existed."""
+    _check_password_length(data.password)
+    if await db.get(User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    password_hash = await asyncio.to_thread(hash_password, data.password)
+    stmt = upsert_insert(UserCredential).values(user_id=user_id, password_hash=password_hash)
+    await db.execute(stmt.on_conflict_do_update(index_elements=[UserCredential.user_id],
+                                                set_={"password_hash": stmt.excluded.password_hash}))
+    await db.commit()
+    return {"user_id": user_id, "password_set": True}
+
+@router.put("/username")
+async def rename_user(data: UsernameRequest, user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Change the current user's display name."""
+    username = data.username.strip()
+    if not username:
+        raise HTTPException(status_code=422, detail="Username is required")
+    db_user = await db.get(User, user.id)
+    db_user.username = username
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Username already taken")
+    identity_cache.invalidate(user.id)
+    leaderboard.rename(user.id, username)
+    return {"user_id": user.id, "username": username}
+
 @router.get("/levels")
-async def get_levels():
-    return LEVELS
+async def get_levels(request: Request):
+    return LEVELS_RESPONSE.response(request)
 
 @router.get("/badges")
-async def get_badges():
-    return BADGES
+async def get_badges(request: Request):
+    return BADGES_RESPONSE.response(request)
 
 @router.get("/level/{xp}")
 async def get_level_for_xp(xp: int):
     return compute_level(xp)
 
 @router.get("/progress")
-async def get_progress(db: AsyncSession = Depends(get_db)):
+async def get_progress(user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
     """Get current XP and completed worlds."""
-    user = await get_current_user(db)
     worlds_result = await db.execute(select(CompletedWorld).where(CompletedWorld.user_id == user.id))
     completed_worlds = [w.world_id for w in worlds_result.scalars().all()]
+    badges = await db.execute(select(UserBadge.badge_id).where(UserBadge.user_id == user.id))
     
     return {
         "xp": user.xp,
-        "completed_worlds": completed_worlds
+        "completed_worlds": completed_worlds,
+        "badges": badges.scalars().all()
     }
 
-from routers.ws import trigger_leaderboard_update
+@router.get("/achievements")
+async def get_achievements(user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    """Badges the user has earned, and progress towards the ones that take several steps."""
+    return await user_achievements(db, user.id)
 
-@router.post("/xp")
-async def add_xp(amount: int, db: AsyncSession = Depends(get_db)):
-    """Add XP to the user."""
-    user = await get_current_user(db)
-    user.xp += amount
+from routers.ws import announce_awards, trigger_leaderboard_update
+
+@router.post("/xp", dependencies=[Depends(require_admin)])
+async def add_xp(amount: int, user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Add XP to the signed-in user (admin only). Players earn XP through
+    server-graded endpoints such as POST /worlds/answers.
+    """
+    result = await db.execute(
+        update(User).where(User.id == user.id)
+        .values(xp=User.xp + amount, xp_version=User.xp_version + 1)
+        .returning(User.username, User.xp, User.xp_version)
+    )
+    username, total_xp, version = result.one()
+    awards = await evaluate(db, [AchievementEvent(user.id, XP, {"xp": total_xp})])
     await db.commit()
-    await db.refresh(user)
+    identity_cache.update_xp(user.id, total_xp)
+    await announce_awards(awards)
     
-    # Broadcast XP update to all connected WebSocket clients
-    await trigger_leaderboard_update(user.id, user.username, user.xp)
+    # Broadcast XP update to all connected WebSocket clients (this also updates the ranked index)
+    await trigger_leaderboard_update(user.id, username, total_xp, version)
     
-    return {"message": f"Added {amount} XP", "total_xp": user.xp}
+    return {"message": f"Added {amount} XP", "total_xp": total_xp}
+
+@router.get("/leaderboard")
+async def get_leaderboard(limit: int = Query(10, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """Top users by XP from the in-memory ranked index."""
+    return {"total": len(leaderboard), "entries": leaderboard.top(limit, offset)}
+
+@router.get("/leaderboard/me")
+async def get_my_rank(window: int = Query(5, ge=0, le=50), user: Identity = Depends(get_current_user)):
+    """The current user's rank plus `window` neighbours on each side."""
+    if leaderboard.rank_of(user.id) is None:
+        # e.g. an account created by a bulk import, not yet seen by this process
+        leaderboard.update(user.id, user.username, user.xp)
+    return {"rank": leaderboard.rank_of(user.id), "total": len(leaderboard), "around": leaderboard.around(user.id, window)}
+
+@router.get("/leaderboard/rank/{user_id}")
+async def get_user_rank(user_id: int):
+    rank = leaderboard.rank_of(user_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User not on the leaderboard")
+    return {"user_id": user_id, "rank": rank, "total": len(leaderboard)}
 
 @router.post("/world")
-async def complete_world(world_id: int, db: AsyncSession = Depends(get_db)):
+async def complete_world(world_id: int, user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Mark a world as completed."""
-    user = await get_current_user(db)
-    
-    existing = await db.execute(
-        select(CompletedWorld).where(CompletedWorld.user_id == user.id, CompletedWorld.world_id == world_id)
-    )
-    if existing.scalar_one_or_none():
+    stmt = upsert_insert(CompletedWorld).values(user_id=user.id, world_id=world_id)
+    stmt = stmt.on_conflict_do_nothing(index_elements=[CompletedWorld.user_id, CompletedWorld.world_id])
+    inserted = (await db.execute(stmt.returning(CompletedWorld.id))).scalar_one_or_none()
+    if inserted is None:
+        await db.commit()
         return {"message": "World already completed"}
-        
-    world = CompletedWorld(user_id=user.id, world_id=world_id)
-    db.add(world)
+    awards = await evaluate(db, [AchievementEvent(user.id, WORLD_COMPLETED, {"world_id": world_id})])
     await db.commit()
+    await announce_awards(awards)
     return {"message": f"World {world_id} completed"}
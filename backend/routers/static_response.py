@@ -0,0 +1,35 @@
+import hashlib
+import json
+import os
+
+from fastapi import Request, Response
+
+# Seconds clients may reuse constant payloads (levels, badges) before revalidating
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "300"))
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so W/ prefixes are ignored."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class StaticJSON:
+    """
+    A constant JSON payload encoded once at import time, served with a strong
+    ETag. A request whose If-None-Match matches gets an empty 304.
+    """
+
+    def __init__(self, content, cache_control: str = f"public, max-age={STATIC_MAX_AGE}"):
+        # Same encoding as FastAPI's JSONResponse
+        self.body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.headers = {"ETag": self.etag, "Cache-Control": cache_control}
+
+    def response(self, request: Request) -> Response:
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=self.headers)
+        return Response(self.body, media_type="application/json", headers=self.headers)
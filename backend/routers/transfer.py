@@ -0,0 +1,248 @@
+import csv
+import io
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from database.aggregates import rebuild_score_stats
+from database.db import ReadSessionLocal, SessionLocal, upsert_insert
+from database.models import CompletedWorld, Mistake, PromptHistory, User
+from database.write_behind import write_buffer
+from routers.gamification import require_admin
+
+# Bulk export/import of analytics for offline grading and moving data between servers (admin only)
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+MAX_IMPORT_ERRORS = 20
+
+# Exported columns per table. Rows carry the username rather than relying on the
+# user id alone, so an export can be imported into a server with different ids.
+EXPORT_TABLES = {
+    "prompt_history": (PromptHistory, {
+        "id": PromptHistory.id, "user_id": PromptHistory.user_id, "username": User.username,
+        "prompt": PromptHistory.prompt_text, "score": PromptHistory.score, "grade": PromptHistory.grade,
+        "grade_label": PromptHistory.grade_label, "created_at": PromptHistory.created_at,
+    }),
+    "mistakes": (Mistake, {
+        "user_id": Mistake.user_id, "username": User.username, "topic": Mistake.topic, "count": Mistake.count,
+    }),
+    "completed_worlds": (CompletedWorld, {
+        "user_id": CompletedWorld.user_id, "username": User.username, "world_id": CompletedWorld.world_id,
+        "completed_at": CompletedWorld.completed_at,
+    }),
+}
+
+def _parse_ids(user_ids: Optional[str]) -> Optional[list]:
+    if not user_ids:
+        return None
+    try:
+        return [int(u) for u in user_ids.split(",") if u.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="user_ids must be comma-separated integers")
+
+def _export_query(table: str, user_ids: Optional[list], since: Optional[datetime], until: Optional[datetime]):
+    model, columns = EXPORT_TABLES[table]
+    query = select(*columns.values()).join(User, User.id == model.user_id)
+    if user_ids:
+        query = query.where(model.user_id.in_(user_ids))
+    if table == "prompt_history":
+        if since is not None:
+            query = query.where(PromptHistory.created_at >= since)
+        if until is not None:
+            query = query.where(PromptHistory.created_at < until)
+    # yield_per streams through a server-side cursor in fixed-size partitions
+    return query.order_by(model.user_id, model.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def _stream_rows(table: str, query):
+    """Yield each partition of rows as a list of dicts, holding one read session for the whole export."""
+    names = list(EXPORT_TABLES[table][1])
+    async with ReadSessionLocal() as db:
+        result = await db.stream(query)
+        async for partition in result.partitions():
+            yield [dict(zip(names, (_jsonable(v) for v in row))) for row in partition]
+
+async def _ndjson(tables: list, user_ids, since, until):
+    for table in tables:
+        async for rows in _stream_rows(table, _export_query(table, user_ids, since, until)):
+            yield "".join(json.dumps({"table": table, **row}) + "\n" for row in rows)
+
+async def _csv(table: str, user_ids, since, until):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(EXPORT_TABLES[table][1]))
+    writer.writeheader()
+    async for rows in _stream_rows(table, _export_query(table, user_ids, since, until)):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@router.get("/export")
+async def export_analytics(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    tables: str = Query(",".join(EXPORT_TABLES), description="Comma-separated subset of: " + ", ".join(EXPORT_TABLES)),
+    user_ids: Optional[str] = Query(None, description="Comma-separated user ids (default: everyone)"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Stream analytics rows as NDJSON (one object per line, tagged with its table) or CSV (one table)."""
+    names = [t.strip() for t in tables.split(",") if t.strip()]
+    unknown = [t for t in names if t not in EXPORT_TABLES]
+    if unknown or not names:
+        raise HTTPException(status_code=422, detail=f"Unknown tables: {', '.join(unknown) or '(none given)'}")
+    ids = _parse_ids(user_ids)
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+
+    if format == "csv":
+        if len(names) != 1:
+            raise HTTPException(status_code=422, detail="CSV export takes exactly one table")
+        headers = {"Content-Disposition": f'attachment; filename="{names[0]}-{stamp}.csv"'}
+        return StreamingResponse(_csv(names[0], ids, since, until), media_type="text/csv", headers=headers)
+    headers = {"Content-Disposition": f'attachment; filename="promptquest-{stamp}.ndjson"'}
+    return StreamingResponse(_ndjson(names, ids, since, until), media_type="application/x-ndjson", headers=headers)
+
+async def _resolve_users(db, usernames: set) -> dict:
+    """Map usernames to local ids, creating accounts that don't exist on this server yet."""
+    stmt = upsert_insert(User).values([{"username": name, "xp": 0} for name in sorted(usernames)])
+    await db.execute(stmt.on_conflict_do_nothing(index_elements=[User.username]))
+    result = await db.execute(select(User.username, User.id).where(User.username.in_(usernames)))
+    return dict(result.all())
+
+def _parse_time(value):
+    # Rows without a timestamp get the import time, like the column's server default
+    return value or datetime.utcnow()
+
+async def _import_batch(batch: list, counts: dict, touched_users: set):
+    """Write one batch of parsed export rows in a single transaction."""
+    async with SessionLocal() as db:
+        ids = await _resolve_users(db, {row["username"] for row in batch})
+        by_table = {table: [] for table in EXPORT_TABLES}
+        for row in batch:
+            by_table[row["table"]].append((ids[row["username"]], row))
+
+        if by_table["prompt_history"]:
+            await db.execute(insert(PromptHistory), [
+                {"user_id": uid, "prompt_text": row["prompt"], "score": row["score"], "grade": row["grade"],
+                 "grade_label": row["grade_label"], "created_at": _parse_time(row.get("created_at"))}
+                for uid, row in by_table["prompt_history"]
+            ])
+            touched_users.update(uid for uid, _ in by_table["prompt_history"])
+        if by_table["mistakes"]:
+            stmt = upsert_insert(Mistake)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Mistake.user_id, Mistake.topic],
+                set_={"count": Mistake.count + stmt.excluded.count},
+            )
+            # Fold repeats first: one statement must not touch the same row twice on PostgreSQL
+            increments = defaultdict(int)
+            for uid, row in by_table["mistakes"]:
+                increments[(uid, row["topic"])] += row["count"]
+            await db.execute(stmt, [{"user_id": u, "topic": t, "count": n} for (u, t), n in increments.items()])
+        if by_table["completed_worlds"]:
+            stmt = upsert_insert(CompletedWorld).on_conflict_do_nothing(
+                index_elements=[CompletedWorld.user_id, CompletedWorld.world_id])
+            worlds = {(uid, row["world_id"]): row.get("completed_at") for uid, row in by_table["completed_worlds"]}
+            await db.execute(stmt, [{"user_id": u, "world_id": w, "completed_at": _parse_time(at)}
+                                    for (u, w), at in worlds.items()])
+        await db.commit()
+    for table, rows in by_table.items():
+        counts[table] += len(rows)
+
+IMPORT_REQUIRED = {
+    "prompt_history": ("prompt", "score", "grade", "grade_label"),
+    "mistakes": ("topic", "count"),
+    "completed_worlds": ("world_id",),
+}
+# Expected type of every imported field; timestamps are optional ISO 8601 strings
+IMPORT_TYPES = {
+    "username": str, "prompt": str, "grade": str, "grade_label": str, "topic": str,
+    "score": int, "count": int, "world_id": int,
+}
+IMPORT_TIMESTAMPS = {"prompt_history": "created_at", "completed_worlds": "completed_at"}
+
+def _parse_line(line: bytes):
+    """Return (row, None) for a valid export line, or (None, reason)."""
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return None, "invalid JSON"
+    if not isinstance(row, dict) or row.get("table") not in EXPORT_TABLES:
+        return None, "missing or unknown 'table'"
+    required = ("username",) + IMPORT_REQUIRED[row["table"]]
+    missing = [f for f in required if row.get(f) in (None, "")]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    # bool is an int subclass, but true/false is never a valid count or score
+    wrong = [f for f in required
+             if not isinstance(row[f], IMPORT_TYPES[f]) or isinstance(row[f], bool)]
+    if wrong:
+        return None, "wrong type for " + ", ".join(f"{f} (expected {IMPORT_TYPES[f].__name__})" for f in wrong)
+    if row["table"] == "mistakes" and row["count"] < 0:
+        return None, "count must not be negative"
+    stamp = IMPORT_TIMESTAMPS.get(row["table"])
+    if stamp and row.get(stamp) not in (None, ""):
+        try:
+            row[stamp] = datetime.fromisoformat(row[stamp])
+        except (TypeError, ValueError):
+            return None, f"{stamp} is not an ISO 8601 timestamp"
+    elif stamp:
+        row[stamp] = None
+    return row, None
+
+@router.post("/import")
+async def import_analytics(request: Request):
+    """
+    Import an NDJSON export (streamed request body). Rows are written in batches of
+    IMPORT_BATCH_SIZE, one transaction each; mistake counts are added to existing ones
+    and already-completed worlds are skipped. Invalid lines are reported, not fatal.
+    """
+    counts = {table: 0 for table in EXPORT_TABLES}
+    errors, batch, touched_users = [], [], set()
+    batches, line_no = 0, 0
+
+    async def lines():
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *complete, pending = pending.split(b"\n")
+            for line in complete:
+                yield line
+        yield pending
+
+    async for line in lines():
+        line_no += 1
+        if not line.strip():
+            continue
+        row, problem = _parse_line(line)
+        if problem:
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line_no, "error": problem})
+            continue
+        batch.append(row)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await _import_batch(batch, counts, touched_users)
+            batches, batch = batches + 1, []
+    if batch:
+        await _import_batch(batch, counts, touched_users)
+        batches += 1
+
+    if touched_users:
+        # Imported history may predate existing rows, so rebuild the aggregates rather than fold into them
+        await write_buffer.sync()
+        async with SessionLocal() as db:
+            await rebuild_score_stats(db, sorted(touched_users))
+            await db.commit()
+    return {"imported": counts, "batches": batches, "errors": errors}
@@ -1,12 +1,28 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import Optional, List
-
-from simulation.pattern import get_pattern_question, check_pattern_answer
-from simulation.prediction import get_prediction_question, check_prediction_answer
-from simulation.hallucination import get_hallucination_question, check_hallucination_answer
+from collections import defaultdict
+import random
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, Literal, Optional, List, Union
+
+from database.achievements import MISTAKE, XP, AchievementEvent, evaluate
+from database.cohorts import record_cohort_activity
+from database.db import get_db, upsert_insert
+from database.identity import Identity, identity_cache
+from database.models import AnsweredQuestion, Mistake, User
+from routers.gamification import get_current_user, require_admin
+from routers.ws import announce_awards, trigger_leaderboard_update
+
+from simulation.pattern import get_pattern_question, get_pattern_questions, check_pattern_answer
+from simulation.prediction import (
+    PREDICTION_BANK, get_prediction_question, get_prediction_questions, check_prediction_answer,
+)
+from simulation.hallucination import (
+    get_hallucination_question, get_hallucination_questions, check_hallucination_answer,
+)
 from simulation.prompt_scorer import score_prompt
-from simulation import mini_trainer
+from simulation import mini_trainer, question_bank
 from simulation.attention import simulate_attention
 from simulation.tokenizer import tokenize
 from simulation.transformer import resolve_pronouns
@@ -15,14 +31,30 @@ from simulation.context import simulate_context_window
 
 router = APIRouter()
 
+# ?n= prefetch: the client fetches several questions in one round trip
+MAX_PREFETCH = 50
+
+def _question_batch(generate, n: int, seed: Optional[int], **kwargs) -> dict:
+    """
+    N distinct questions from a seeded generator. Replaying the same seed, n and
+    difficulty against the same bank returns the same batch.
+    """
+    if seed is None:
+        seed = random.getrandbits(32)
+    questions = generate(n, rng=random.Random(seed), **kwargs)
+    return {"seed": seed, "count": len(questions), "questions": questions}
+
 # ===================== WORLD 1: AI Basics =====================
 class PatternAnswer(BaseModel):
     question_item: str
     answer: str
 
 @router.get("/1/question")
-async def world1_question(difficulty: str = "easy"):
-    return get_pattern_question(difficulty)
+async def world1_question(difficulty: str = "easy", n: Optional[int] = Query(None, ge=1, le=MAX_PREFETCH),
+                          seed: Optional[int] = None):
+    if n is None:
+        return get_pattern_question(difficulty)
+    return _question_batch(get_pattern_questions, n, seed, difficulty=difficulty)
 
 @router.post("/1/answer")
 async def world1_answer(data: PatternAnswer):
@@ -31,16 +63,20 @@ async def world1_answer(data: PatternAnswer):
 
 # ===================== WORLD 2: Prediction Engine =====================
 class PredictionAnswer(BaseModel):
-    prompt: str
+    prompt: str = ""
     answer: str
+    question_id: Optional[str] = None  # the question's "id"; preferred over matching the prompt text
 
 @router.get("/2/question")
-async def world2_question():
-    return get_prediction_question()
+async def world2_question(n: Optional[int] = Query(None, ge=1, le=MAX_PREFETCH), seed: Optional[int] = None,
+                          difficulty: Optional[str] = None):
+    if n is None:
+        return get_prediction_question()
+    return _question_batch(get_prediction_questions, n, seed, difficulty=difficulty)
 
 @router.post("/2/answer")
 async def world2_answer(data: PredictionAnswer):
-    return check_prediction_answer(data.prompt, data.answer)
+    return check_prediction_answer(data.prompt, data.answer, data.question_id)
 
 
 # ===================== WORLD 3: Tokenization =====================
@@ -109,8 +145,11 @@ class HallucinationAnswer(BaseModel):
     answer: bool
 
 @router.get("/9/question")
-async def world9_question():
-    return get_hallucination_question()
+async def world9_question(n: Optional[int] = Query(None, ge=1, le=MAX_PREFETCH), seed: Optional[int] = None,
+                          difficulty: Optional[str] = None):
+    if n is None:
+        return get_hallucination_question()
+    return _question_batch(get_hallucination_questions, n, seed, difficulty=difficulty)
 
 @router.post("/9/answer")
 async def world9_answer(data: HallucinationAnswer):
@@ -142,3 +181,128 @@ async def world10_state(session_id: str = "default"):
 @router.delete("/10/reset")
 async def world10_reset(session_id: str = "default"):
     return mini_trainer.reset_model(session_id)
+
+
+# ===================== QUESTION BANKS =====================
+@router.post("/banks/reload", dependencies=[Depends(require_admin)])
+async def reload_question_banks():
+    """
+    Re-read every question bank file now instead of waiting for the mtime check
+    (admin only). If any file is broken, no bank is swapped and the errors come back as a 422.
+    """
+    try:
+        return {"questions": question_bank.reload_all()}
+    except question_bank.QuestionBankError as e:
+        raise HTTPException(status_code=422, detail=f"No banks reloaded: {e}")
+
+
+# ===================== BATCH ANSWERS (Worlds 1, 2, 9) =====================
+MAX_BATCH_ANSWERS = 100
+
+class BatchPatternAnswer(PatternAnswer):
+    world: Literal[1]
+
+class BatchPredictionAnswer(PredictionAnswer):
+    world: Literal[2]
+
+class BatchHallucinationAnswer(HallucinationAnswer):
+    world: Literal[9]
+
+class AnswerBatch(BaseModel):
+    answers: List[Annotated[
+        Union[BatchPatternAnswer, BatchPredictionAnswer, BatchHallucinationAnswer], Field(discriminator="world")
+    ]]
+
+def _prediction_key(answer: PredictionAnswer) -> str:
+    """The question's id whether it was answered by id or by prompt text."""
+    q = PREDICTION_BANK.get(answer.question_id) if answer.question_id else PREDICTION_BANK.find(answer.prompt)
+    return q["id"] if q else (answer.question_id or answer.prompt)
+
+# world -> (analytics topic, question key, grader)
+ANSWER_GRADERS = {
+    1: ("pattern", lambda a: a.question_item, lambda a: check_pattern_answer(a.question_item, a.answer)),
+    2: ("prediction", _prediction_key, lambda a: check_prediction_answer(a.prompt, a.answer, a.question_id)),
+    9: ("hallucination", lambda a: a.question_id, lambda a: check_hallucination_answer(a.question_id, a.answer)),
+}
+
+@router.post("/answers")
+async def submit_answers(data: AnswerBatch, user: Identity = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Grade a batch of world 1, 2 and 9 answers on the server and apply the XP,
+    mistake counts and badge progress in one transaction. A question answered
+    more than once in the same batch only counts the first time, and XP for a
+    question is awarded once per user: answers that earn XP are recorded in
+    answered_questions and later answers to the same question earn none.
+    Only questions the server can look up count: unknown or malformed ones
+    (`invalid`) and world 1 number sequences, which are generated on the fly
+    and so cannot be told apart from forged ones, earn no XP and record no mistake.
+    """
+    if not data.answers:
+        raise HTTPException(status_code=422, detail="answers must not be empty")
+    if len(data.answers) > MAX_BATCH_ANSWERS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_ANSWERS} answers per batch")
+
+    results, seen, scoring = [], set(), {}
+    mistakes = defaultdict(int)
+    for answer in data.answers:
+        topic, question_key, grade = ANSWER_GRADERS[answer.world]
+        key = (answer.world, str(question_key(answer)))
+        if key in seen:
+            results.append({"world": answer.world, "duplicate": True, "xp_earned": 0})
+            continue
+        seen.add(key)
+        result = {"world": answer.world, **grade(answer)}
+        results.append(result)
+        if result.get("invalid") or result.get("generated"):
+            result["xp_earned"] = 0
+            continue
+        if not result["is_correct"]:
+            mistakes[topic] += 1
+        if result["xp_earned"]:
+            scoring[key] = result
+
+    if scoring:
+        # Claim the questions; ones this user already earned XP for conflict and come back empty
+        stmt = upsert_insert(AnsweredQuestion).values([
+            {"user_id": user.id, "world": world, "question_key": question_key} for world, question_key in scoring])
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=[AnsweredQuestion.user_id, AnsweredQuestion.world, AnsweredQuestion.question_key])
+        claimed = set(await db.execute(stmt.returning(AnsweredQuestion.world, AnsweredQuestion.question_key)))
+        for key, result in scoring.items():
+            if key not in claimed:
+                result.update(xp_earned=0, already_answered=True)
+    xp_earned = sum(result["xp_earned"] for result in results)
+
+    events = [AchievementEvent(user.id, MISTAKE, {"topic": t}) for t, n in mistakes.items() for _ in range(n)]
+    username, total_xp = user.username, user.xp
+    if xp_earned:
+        row = await db.execute(
+            update(User).where(User.id == user.id)
+            .values(xp=User.xp + xp_earned, xp_version=User.xp_version + 1)
+            .returning(User.username, User.xp, User.xp_version)
+        )
+        username, total_xp, version = row.one()
+        events.append(AchievementEvent(user.id, XP, {"xp": total_xp}))
+    if mistakes:
+        stmt = upsert_insert(Mistake)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Mistake.user_id, Mistake.topic],
+            set_={"count": Mistake.count + stmt.excluded.count},
+        )
+        await db.execute(stmt, [{"user_id": user.id, "topic": t, "count": n} for t, n in sorted(mistakes.items())])
+        await record_cohort_activity(db, mistakes={(user.id, t): n for t, n in mistakes.items()})
+    awards = await evaluate(db, events)
+    await db.commit()
+
+    if xp_earned:
+        identity_cache.update_xp(user.id, total_xp)
+        # One leaderboard event for the whole batch
+        await trigger_leaderboard_update(user.id, username, total_xp, version)
+    await announce_awards(awards)
+    return {
+        "results": results,
+        "xp_earned": xp_earned,
+        "total_xp": total_xp,
+        "mistakes": dict(mistakes),
+        "badges_awarded": [award["badge"] for award in awards],
+    }
@@ -1,49 +1,435 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List
 import json
 import asyncio
+import logging
+import os
+import time
+
+from database.identity import token_from_request, verify_token
+from database.leaderboard import leaderboard
+from realtime.pubsub import bus
+from simulation import telemetry
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Messages buffered per client before it counts as a slow consumer
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+# A single send taking longer than this means the client is gone or stuck
+SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# What to do with a client whose queue is full: "resync" replaces its backlog with a
+# fresh snapshot, "drop" disconnects it
+SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER", "resync").lower()
+# XP updates arriving within one tick are merged per user; 0 sends every update immediately
+COALESCE_TICK_MS = int(os.getenv("WS_COALESCE_TICK_MS", "100"))
+# A tick that moves more users than this (e.g. one user jumping thousands of places)
+# sends protocol-2 clients a fresh snapshot instead of a batch
+MAX_BATCH_CHANGES = int(os.getenv("WS_MAX_BATCH_CHANGES", "1000"))
+
+# Heartbeats: the server sends {"type": "ping"} every interval; any message from the
+# client (e.g. {"type": "pong"}) counts as a sign of life. Silent clients are reaped.
+PING_INTERVAL_SECONDS = float(os.getenv("WS_PING_INTERVAL", "20"))
+IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+# Per-process cap; clients beyond it get a server_full message and are closed with 1013
+MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "2000"))
+
+# Protocol 1: one xp_update message per (coalesced) change.
+# Protocol 2: one leaderboard_batch message per tick. Clients opt in with
+# ?protocol=2 or by sending {"type": "hello", "protocol": 2}.
+PROTOCOL_VERSIONS = (1, 2)
+
+WS_MESSAGES = telemetry.register(telemetry.Counter(
+    "promptquest_ws_messages_sent_total", "WebSocket messages written to clients."))
+WS_DROPS = telemetry.register(telemetry.Counter(
+    "promptquest_ws_drops_total", "Slow or failed WebSocket clients, by action taken.", ("reason",)))
+WS_REJECTED = telemetry.register(telemetry.Counter(
+    "promptquest_ws_rejected_total", "WebSocket connections refused because the process was at its cap."))
+
+
+class Client:
+    """One connected socket with its bounded outbound queue and the task draining it."""
+
+    def __init__(self, websocket: WebSocket, protocol: int = 1, user_id: int = None):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.user_id = user_id  # set when the socket presented a session token
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.task = None
+        self.connected_at = self.last_seen = time.monotonic()
+
+    def offer(self, text: str) -> bool:
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def resync(self, text: str):
+        """Discard the backlog and queue a full snapshot in its place."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(text)
+
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.clients: dict = {}  # WebSocket -> Client
+        self.by_user: dict = {}  # user id -> set of that user's Clients, for personal events
+        self._reaper = None
+
+    @property
+    def queued_messages(self) -> int:
+        return sum(c.queue.qsize() for c in self.clients.values())
+
+    @property
+    def max_queue_depth(self) -> int:
+        return max((c.queue.qsize() for c in self.clients.values()), default=0)
 
-    async def connect(self, websocket: WebSocket):
+    @property
+    def full(self) -> bool:
+        return len(self.clients) >= MAX_CONNECTIONS
+
+    async def connect(self, websocket: WebSocket, protocol: int = 1, user_id: int = None):
+        """Accept the socket and start its writer; returns None if the process is at its cap."""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        if self.full:
+            WS_REJECTED.inc()
+            await websocket.send_json({"type": "error", "reason": "server_full", "retry_after": 5})
+            await self._close(websocket, 1013)  # try again later
+            return None
+        client = Client(websocket, protocol)
+        self.clients[websocket] = client
+        self.identify(client, user_id)
+        client.task = asyncio.create_task(self._writer(client))
+        return client
+
+    def identify(self, client: Client, user_id: int):
+        """Attach the socket to a user so it receives that user's personal events."""
+        peers = self.by_user.get(client.user_id)
+        if peers is not None:
+            peers.discard(client)
+            if not peers:
+                del self.by_user[client.user_id]
+        client.user_id = user_id
+        if user_id is not None:
+            self.by_user.setdefault(user_id, set()).add(client)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            self.identify(client, None)
+        if client is not None and client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    async def _writer(self, client: Client):
+        """Send queued messages to one client; a failed or stuck send disconnects it."""
+        try:
+            while True:
+                text = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(text), SEND_TIMEOUT_SECONDS)
+                WS_MESSAGES.inc()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            WS_DROPS.inc("send_timeout" if isinstance(e, asyncio.TimeoutError) else "send_error")
+            logger.info("dropping websocket client after failed send: %r", e)
+            self.disconnect(client.websocket)
+            await self._close(client.websocket, 1011)
+
+    def start(self):
+        if self._reaper is None and PING_INTERVAL_SECONDS > 0:
+            self._reaper = asyncio.create_task(self._heartbeat())
 
-    async def broadcast(self, message: dict):
-        # Fire and forget messages to all clients
-        for connection in self.active_connections:
+    async def stop(self):
+        """Stop heartbeats and close every socket with 1001 (going away)."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for websocket in list(self.clients):
+            self.disconnect(websocket)
+            await self._close(websocket, 1001)
+
+    async def _heartbeat(self):
+        """Ping every client each interval and reap those silent for longer than the idle timeout."""
+        while True:
+            await asyncio.sleep(PING_INTERVAL_SECONDS)
             try:
-                await connection.send_json(message)
+                self.reap()
+                await self.broadcast({"type": "ping", "ts": time.time()})
             except Exception:
-                pass # Client disconnected abruptly
+                logger.exception("websocket heartbeat failed")
+
+    def reap(self) -> int:
+        now = time.monotonic()
+        reaped = 0
+        for websocket, client in list(self.clients.items()):
+            if now - client.last_seen > IDLE_TIMEOUT_SECONDS:
+                WS_DROPS.inc("idle_timeout")
+            elif client.task is not None and client.task.done():
+                WS_DROPS.inc("writer_exited")
+            else:
+                continue
+            self.disconnect(websocket)
+            asyncio.create_task(self._close(websocket, 1001))
+            reaped += 1
+        return reaped
+
+    def stats(self) -> dict:
+        by_protocol = {}
+        for client in self.clients.values():
+            by_protocol[client.protocol] = by_protocol.get(client.protocol, 0) + 1
+        return {
+            "connections": len(self.clients),
+            "max_connections": MAX_CONNECTIONS,
+            "by_protocol": by_protocol,
+            "identified_users": len(self.by_user),
+            "queued_messages": self.queued_messages,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass  # Already gone
+
+    def send(self, client: Client, message: dict):
+        """Queue a message for one client without waiting on the socket."""
+        self._deliver([client], json.dumps(message))
+
+    def send_to_user(self, user_id: int, message: dict):
+        clients = list(self.by_user.get(user_id, ()))
+        if clients:
+            self._deliver(clients, json.dumps(message))
+
+    async def broadcast(self, message: dict, protocol: int = None):
+        """Encode once and enqueue for every client (or those speaking `protocol`); never waits on a socket."""
+        clients = [c for c in self.clients.values() if protocol is None or c.protocol == protocol]
+        if clients:
+            self._deliver(clients, json.dumps(message))
+
+    def _deliver(self, clients: list, text: str):
+        snapshots = {}
+        for client in clients:
+            if client.offer(text):
+                continue
+            # Slow consumer: its queue is full
+            if SLOW_CONSUMER_POLICY == "resync":
+                if client.protocol not in snapshots:
+                    snapshots[client.protocol] = json.dumps(snapshot_message(client.protocol))
+                client.resync(snapshots[client.protocol])
+                WS_DROPS.inc("resync")
+            else:
+                WS_DROPS.inc("evicted")
+                self.disconnect(client.websocket)
+                # 1013 = try again later
+                asyncio.create_task(self._close(client.websocket, 1013))
 
 manager = ConnectionManager()
 
+telemetry.register(telemetry.Gauge(
+    "promptquest_ws_connections", "Open WebSocket connections.", callback=lambda: len(manager.clients)))
+telemetry.register(telemetry.Gauge(
+    "promptquest_ws_queued_messages", "Messages waiting in all WebSocket send queues.",
+    callback=lambda: manager.queued_messages))
+telemetry.register(telemetry.Gauge(
+    "promptquest_ws_max_queue_depth", "Deepest single WebSocket send queue.", callback=lambda: manager.max_queue_depth))
+
+@router.get("/stats")
+async def websocket_stats():
+    """Connection count, cap and queue depth for this worker."""
+    return manager.stats()
+
+def snapshot_message(protocol: int) -> dict:
+    message = leaderboard.snapshot()
+    message["protocol"] = protocol
+    message["tick_ms"] = COALESCE_TICK_MS
+    return message
+
+def _negotiate(requested) -> int:
+    """Highest protocol we support that is not newer than the client's."""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return PROTOCOL_VERSIONS[0]
+    return max([v for v in PROTOCOL_VERSIONS if v <= requested] or [PROTOCOL_VERSIONS[0]])
+
+def _handle_client_message(client: Client, text: str):
+    client.last_seen = time.monotonic()
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return
+    if isinstance(message, dict) and message.get("type") == "hello":
+        client.protocol = _negotiate(message.get("protocol"))
+        if message.get("token"):
+            manager.identify(client, verify_token(str(message["token"])))
+        manager.send(client, snapshot_message(client.protocol))
+
+def _socket_user(websocket: WebSocket):
+    """User id from ?token=, the Authorization header or the session cookie; None when anonymous."""
+    token = websocket.query_params.get("token") or token_from_request(websocket)
+    return verify_token(token) if token else None
+
 @router.websocket("/leaderboard")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    client = await manager.connect(
+        websocket, _negotiate(websocket.query_params.get("protocol", 1)), _socket_user(websocket))
+    if client is None:
+        return
     try:
+        # New clients start from the current standings, then follow xp_update deltas
+        manager.send(client, snapshot_message(client.protocol))
         while True:
-            # We don't expect much incoming data from clients, just ping/pong usually
-            data = await websocket.receive_text()
-    except WebSocketDisconnect:
+            _handle_client_message(client, await websocket.receive_text())
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # Client left, or we closed the socket after evicting it
+    finally:
         manager.disconnect(websocket)
 
-# Helper function to trigger a leaderboard update event from other routes
-async def trigger_leaderboard_update(user_id: int, username: str, new_xp: int):
-    event = {
+
+class EventCoalescer:
+    """
+    Merges XP updates per user and flushes them once per tick: protocol-2 clients
+    get one leaderboard_batch listing every user whose rank or XP changed (users
+    passed by a mover included), protocol-1 clients one xp_update per user whose
+    XP changed (they re-sort by XP themselves). Users whose XP and rank both
+    ended the tick where they started are left out.
+    """
+
+    def __init__(self, tick_ms: int = COALESCE_TICK_MS):
+        self.tick = tick_ms / 1000
+        self.seq = 0
+        self._pending = {}  # user id -> XP at the start of the tick (None if new to the board)
+        self._task = None
+
+    def add(self, user_id: int, username: str, xp: int, version: int = None):
+        before = leaderboard.xp_of(user_id)
+        if not leaderboard.update(user_id, username, xp, version):
+            return  # older than what this worker already applied
+        self._pending.setdefault(user_id, before)
+        if self.tick > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self.tick)
+            await self.flush()
+
+    @staticmethod
+    def _rank_before(user_id: int, old_xp, movers: list):
+        """
+        Rank `user_id` had at the start of the tick: its place on the current
+        board, corrected for every user who changed XP since (`movers` holds
+        their (user id, new key, old key) sort keys).
+        """
+        if old_xp is None:
+            return None
+        key = (-old_xp, user_id)
+        rank = 1 + leaderboard.ahead_of(user_id, old_xp)
+        for mover_id, new_key, old_key in movers:
+            # The board holds movers at their new keys; count them where they were instead
+            rank -= new_key < key
+            if mover_id != user_id:
+                rank += old_key is not None and old_key < key
+        return rank
+
+    def _changes(self, pending: dict):
+        """
+        Every user whose XP or rank changed this tick, with their previous rank.
+        Only users between a mover's old and new places can have been passed.
+        Returns (moved, changes): the pending users that changed, and all
+        changes, or None for changes when there are more than MAX_BATCH_CHANGES.
+        """
+        movers = []
+        for user_id, old_xp in pending.items():
+            xp = leaderboard.xp_of(user_id)
+            if xp is not None:
+                movers.append((user_id, (-xp, user_id), (-old_xp, user_id) if old_xp is not None else None))
+        moved, lo, hi = [], len(leaderboard), 1
+        for user_id, old_xp in pending.items():
+            entry = leaderboard.entry(user_id)
+            if entry is None:
+                continue
+            previous_rank = self._rank_before(user_id, old_xp, movers)
+            # A user new to the board pushes everyone below it down one place
+            lo = min(lo, entry["rank"], previous_rank or entry["rank"])
+            hi = max(hi, entry["rank"], previous_rank or len(leaderboard))
+            if entry["xp"] != old_xp or entry["rank"] != previous_rank:
+                moved.append({**entry, "previous_rank": previous_rank})
+        if not moved:
+            return moved, []
+        # Slack for places shifted by the other movers
+        lo, hi = max(1, lo - len(pending)), min(len(leaderboard), hi + len(pending))
+        if hi - lo + 1 > MAX_BATCH_CHANGES + len(pending):
+            return moved, None
+        changes = list(moved)
+        for entry in leaderboard.top(hi - lo + 1, lo - 1):
+            if entry["user_id"] in pending:
+                continue
+            previous_rank = self._rank_before(entry["user_id"], entry["xp"], movers)
+            if previous_rank != entry["rank"]:
+                changes.append({**entry, "previous_rank": previous_rank})
+        changes.sort(key=lambda c: c["rank"])
+        return moved, changes
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        moved, changes = self._changes(pending)
+        if not moved:
+            return
+        self.seq += 1
+        if changes is None:
+            await manager.broadcast(snapshot_message(2), protocol=2)
+        else:
+            await manager.broadcast({
+                "type": "leaderboard_batch",
+                "protocol": 2,
+                "seq": self.seq,
+                "total": len(leaderboard),
+                "changes": changes,
+            }, protocol=2)
+        for change in sorted(moved, key=lambda c: c["rank"]):
+            data = {k: change[k] for k in ("user_id", "username", "xp", "rank")}
+            await manager.broadcast({"type": "xp_update", "data": data}, protocol=1)
+
+coalescer = EventCoalescer()
+
+LEADERBOARD_CHANNEL = "leaderboard"
+
+# Helper function to trigger a leaderboard update event from other routes.
+# Goes through the bus so clients connected to other workers hear about it too.
+# `version` is the user's xp_version from the transaction that committed `new_xp`.
+async def trigger_leaderboard_update(user_id: int, username: str, new_xp: int, version: int):
+    await bus.publish(LEADERBOARD_CHANNEL, {
         "type": "xp_update",
         "data": {
             "user_id": user_id,
             "username": username,
-            "xp": new_xp
+            "xp": new_xp,
+            "version": version
         }
-    }
-    await manager.broadcast(event)
+    })
+
+async def _relay_leaderboard_event(event: dict):
+    """Apply an XP change from any worker to our ranked index, then fan out to our sockets."""
+    data = event["data"]
+    # Concurrent awards can be published out of commit order; the version drops the stale one
+    coalescer.add(data["user_id"], data["username"], data["xp"], data.get("version"))
+    if coalescer.tick <= 0:
+        await coalescer.flush()
+
+bus.subscribe(LEADERBOARD_CHANNEL, _relay_leaderboard_event)
+
+ACHIEVEMENTS_CHANNEL = "achievements"
+
+async def announce_awards(awards: list):
+    """Publish committed badge awards so each worker can push them to the owner's sockets."""
+    for award in awards:
+        await bus.publish(ACHIEVEMENTS_CHANNEL, {"type": "badge_awarded", "data": award})
+
+async def _relay_user_event(event: dict):
+    """Personal events (e.g. badge awards) go only to the owner's sockets on this worker."""
+    manager.send_to_user(event["data"]["user_id"], event)
+
+bus.subscribe(ACHIEVEMENTS_CHANNEL, _relay_user_event)
@@ -0,0 +1,166 @@
+"""
+Byte-level BPE tokenizer (GPT-2 style).
+
+Loads `vocab.json` (token -> id) and `merges.txt` (one "a b" pair per line,
+highest priority first) from BPE_VOCAB_DIR, simulation/data/bpe by default.
+Files in the GPT-2/RoBERTa format work as-is, so pointing BPE_VOCAB_DIR at
+the model's own files makes counts match what that model consumes. The
+bundled vocabulary is a small one trained by tools/train_bpe.py on this repo's
+text, so its splits and ids do not match Ollama's (or any real) model.
+
+Text is split by a regex pre-tokenizer, each piece is mapped byte-by-byte to
+printable characters, and merges are applied lowest rank first from a heap
+over a linked list of symbols. Encoded pieces are memoized in an LRU cache,
+since real text repeats the same words constantly.
+"""
+import codecs
+import heapq
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+
+BUNDLED_VOCAB_DIR = os.path.join(os.path.dirname(__file__), "data", "bpe")
+VOCAB_DIR = os.getenv("BPE_VOCAB_DIR", BUNDLED_VOCAB_DIR)
+CACHE_SIZE = int(os.getenv("BPE_CACHE_SIZE", "65536"))
+
+# GPT-2's pre-tokenizer, with \p{L} / \p{N} spelled for the stdlib `re` module
+PRETOKENIZE = re.compile(r"""'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+""")
+
+
+def _byte_notation(error: UnicodeDecodeError):
+    """Decode error handler: show bytes that are only part of a character as <0xE2>."""
+    return "".join(f"<0x{b:02X}>" for b in error.object[error.start:error.end]), error.end
+
+
+codecs.register_error("bpe_bytes", _byte_notation)
+
+
+def bytes_to_unicode() -> dict:
+    """Map every byte to a printable character, so vocab entries are plain strings."""
+    printable = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + \
+        list(range(ord("®"), ord("ÿ") + 1))
+    chars = printable[:]
+    extra = 0
+    for b in range(256):
+        if b not in printable:
+            printable.append(b)
+            chars.append(256 + extra)
+            extra += 1
+    return dict(zip(printable, map(chr, chars)))
+
+
+BYTE_ENCODER = bytes_to_unicode()
+BYTE_DECODER = {c: b for b, c in BYTE_ENCODER.items()}
+
+
+class BPETokenizer:
+    def __init__(self, vocab: dict, merges: list, cache_size: int = CACHE_SIZE):
+        self.encoder = vocab
+        self.decoder = {i: token for token, i in vocab.items()}
+        self.ranks = {pair: rank for rank, pair in enumerate(merges)}
+        self.encode_piece = lru_cache(maxsize=cache_size)(self._encode_piece)
+
+    @classmethod
+    def from_dir(cls, path: str = VOCAB_DIR, cache_size: int = CACHE_SIZE) -> "BPETokenizer":
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        merges = []
+        with open(os.path.join(path, "merges.txt"), encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#version") or not line.strip():
+                    continue
+                a, b = line.rstrip("\n").split(" ")
+                merges.append((a, b))
+        return cls(vocab, merges, cache_size)
+
+    def bpe(self, symbols: str) -> list:
+        """Apply merges to one byte-level piece, lowest rank first; returns the token strings."""
+        n = len(symbols)
+        if n < 2:
+            return [symbols]
+        ranks = self.ranks
+        parts = list(symbols)
+        nxt = list(range(1, n + 1))
+        nxt[-1] = -1
+        prev = list(range(-1, n - 1))
+        heap = []
+        for i in range(n - 1):
+            rank = ranks.get((parts[i], parts[i + 1]))
+            if rank is not None:
+                heap.append((rank, i))
+        heapq.heapify(heap)
+        while heap:
+            rank, i = heapq.heappop(heap)
+            j = nxt[i]
+            # Skip entries made stale by an earlier merge next to them
+            if parts[i] is None or j == -1 or ranks.get((parts[i], parts[j])) != rank:
+                continue
+            parts[i] += parts[j]
+            parts[j] = None
+            k = nxt[i] = nxt[j]
+            if k != -1:
+                prev[k] = i
+                rank = ranks.get((parts[i], parts[k]))
+                if rank is not None:
+                    heapq.heappush(heap, (rank, i))
+            p = prev[i]
+            if p != -1:
+                rank = ranks.get((parts[p], parts[i]))
+                if rank is not None:
+                    heapq.heappush(heap, (rank, p))
+        return [part for part in parts if part is not None]
+
+    def _encode_piece(self, piece: str) -> tuple:
+        # latin-1 turns each UTF-8 byte into one character, which translate() maps to its symbol
+        symbols = piece.encode("utf-8").decode("latin-1").translate(BYTE_ENCODER)
+        encoder = self.encoder
+        ids = []
+        for token in self.bpe(symbols):
+            token_id = encoder.get(token)
+            if token_id is None:
+                # Vocab without this merge result: fall back to its single bytes
+                ids.extend(encoder[c] for c in token)
+            else:
+                ids.append(token_id)
+        return tuple(ids)
+
+    def encode(self, text: str) -> list:
+        ids = []
+        encode_piece = self.encode_piece
+        for piece in PRETOKENIZE.findall(text):
+            ids.extend(encode_piece(piece))
+        return ids
+
+    def count(self, text: str) -> int:
+        encode_piece = self.encode_piece
+        return sum(len(encode_piece(piece)) for piece in PRETOKENIZE.findall(text))
+
+    def token_bytes(self, token_id: int) -> bytes:
+        return bytes(BYTE_DECODER[c] for c in self.decoder[token_id])
+
+    def token_text(self, token_id: int) -> str:
+        """One token for display; a token holding part of a multi-byte character shows those bytes as <0x..>."""
+        return self.token_bytes(token_id).decode("utf-8", errors="bpe_bytes")
+
+    def decode(self, ids: list) -> str:
+        return b"".join(self.token_bytes(i) for i in ids).decode("utf-8", errors="replace")
+
+
+_tokenizer = None
+_lock = threading.Lock()
+
+
+def get_tokenizer() -> BPETokenizer:
+    """The shared tokenizer, loaded from BPE_VOCAB_DIR on first use."""
+    global _tokenizer
+    if _tokenizer is None:
+        with _lock:
+            if _tokenizer is None:
+                _tokenizer = BPETokenizer.from_dir()
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    return get_tokenizer().count(text)
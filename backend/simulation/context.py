@@ -1,4 +1,4 @@
-import math
+from .bpe import count_tokens
 
 def simulate_context_window(messages: list, max_tokens: int = 50) -> dict:
     """
@@ -11,8 +11,7 @@ def simulate_context_window(messages: list, max_tokens: int = 50) -> dict:
     
     # Process from newest to oldest
     for msg in reversed(messages):
-        # Rough token estimation: 1 word ~ 1.3 tokens
-        msg_tokens = math.ceil(len(msg["text"].split()) * 1.3)
+        msg_tokens = count_tokens(msg["text"])
         
         if total_tokens + msg_tokens <= max_tokens:
             retained_messages.insert(0, {**msg, "tokens": msg_tokens, "status": "retained"})
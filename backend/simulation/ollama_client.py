@@ -1,8 +1,11 @@
 import httpx
 import asyncio
+import os
+import time
 from typing import Optional
+from simulation import telemetry
 
-OLLAMA_BASE = "http://localhost:11434"
+OLLAMA_BASE = os.getenv("OLLAMA_BASE", "http://localhost:11434")
 DEFAULT_MODEL = "llama3.2"  # fallback: tinyllama
 
 
@@ -54,24 +57,48 @@ async def generate(prompt: str, model: Optional[str] = None, system: Optional[st
 
     try:
         async with httpx.AsyncClient(timeout=60.0) as client:
+            started = time.perf_counter()
             r = await client.post(f"{OLLAMA_BASE}/api/generate", json=payload)
+            wall_seconds = time.perf_counter() - started
             if r.status_code == 200:
                 data = r.json()
+                telemetry.record_generation(model, data, wall_seconds)
                 return {
                     "success": True,
                     "response": data.get("response", ""),
                     "model": model,
-                    "total_duration_ms": round(data.get("total_duration", 0) / 1e6, 0),
+                    **_timings(data, wall_seconds),
                     "error": None
                 }
             else:
+                telemetry.record_failure(model, f"http_{r.status_code}")
                 return {"success": False, "response": "", "model": model,
                         "error": f"Ollama returned HTTP {r.status_code}"}
     except httpx.ConnectError:
+        telemetry.record_failure(model, "connect_error")
         return {"success": False, "response": "", "model": model,
                 "error": "Ollama is not running. Start it with: ollama serve"}
     except httpx.TimeoutException:
+        telemetry.record_failure(model, "timeout")
         return {"success": False, "response": "", "model": model,
                 "error": "Ollama request timed out. Try a smaller model like tinyllama."}
     except Exception as e:
+        telemetry.record_failure(model, "error")
         return {"success": False, "response": "", "model": model, "error": str(e)}
+
+
+def _timings(data: dict, wall_seconds: float) -> dict:
+    """Break an Ollama response's nanosecond timings into load / prefill / decode / queue."""
+    total_ns = data.get("total_duration", 0)
+    eval_ns = data.get("eval_duration", 0)
+    eval_count = data.get("eval_count", 0)
+    return {
+        "total_duration_ms": round(total_ns / 1e6, 0),
+        "load_duration_ms": round(data.get("load_duration", 0) / 1e6, 1),
+        "prompt_eval_count": data.get("prompt_eval_count", 0),
+        "prompt_eval_duration_ms": round(data.get("prompt_eval_duration", 0) / 1e6, 1),
+        "eval_count": eval_count,
+        "eval_duration_ms": round(eval_ns / 1e6, 1),
+        "tokens_per_second": round(eval_count / (eval_ns / 1e9), 1) if eval_ns else 0.0,
+        "queue_wait_ms": round(max(0.0, wall_seconds * 1e3 - total_ns / 1e6), 1),
+    }
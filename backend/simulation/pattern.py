@@ -1,44 +1,44 @@
 import random
 
-# Category patterns for AI Basics world
-CATEGORIES = {
-    "Animal": ["Dog", "Cat", "Elephant", "Lion", "Tiger", "Rabbit", "Horse", "Bear", "Fox", "Wolf", "Deer", "Monkey"],
-    "Vehicle": ["Car", "Truck", "Bus", "Motorcycle", "Bicycle", "Train", "Airplane", "Boat", "Scooter", "Van"],
-    "Fruit": ["Apple", "Banana", "Mango", "Orange", "Grape", "Strawberry", "Watermelon", "Pineapple", "Cherry", "Pear"],
-    "Country": ["India", "France", "Japan", "Brazil", "Australia", "Germany", "Canada", "Italy", "China", "Mexico"],
-    "Planet": ["Earth", "Mars", "Jupiter", "Saturn", "Venus", "Mercury", "Neptune", "Uranus"],
-    "Vegetable": ["Carrot", "Broccoli", "Spinach", "Tomato", "Potato", "Onion", "Cucumber", "Pepper"],
-}
-
-ITEM_TO_CATEGORY = {}
-for cat, items in CATEGORIES.items():
-    for item in items:
-        ITEM_TO_CATEGORY[item] = cat
-
-
-def generate_number_pattern() -> dict:
+from .question_bank import QuestionBank, register
+
+
+def _group_by_category(items: list) -> dict:
+    categories = {}
+    for q in items:
+        categories.setdefault(q["category"], []).append(q["item"])
+    # Wrong-answer candidates per category, so serving a question builds no lists
+    others = {cat: [c for c in categories if c != cat] for cat in categories}
+    return {"others": others, "items": items}
+
+
+# Word items for the AI Basics world, keyed by the item itself
+PATTERN_BANK = register(QuestionBank("pattern", "pattern_items.json", key="item", prepare=_group_by_category))
+
+
+def generate_number_pattern(rng=random) -> dict:
     """Generate a sequence prediction pattern (e.g. 2, 4, 6, 8 -> 10)."""
     examples = []
     # Build 3 examples of arithmetic progressions
     for _ in range(3):
-        start = random.randint(1, 10)
-        step = random.randint(1, 5)
+        start = rng.randint(1, 10)
+        step = rng.randint(1, 5)
         seq = [start + i*step for i in range(4)]
         next_val = start + 4*step
         examples.append({"item": " ".join(map(str, seq)), "category": str(next_val)})
         
     # Build the actual question
-    start = random.randint(2, 15)
-    step = random.randint(2, 6)
+    start = rng.randint(2, 15)
+    step = rng.randint(2, 6)
     seq = [start + i*step for i in range(4)]
     correct = start + 4*step
     
     options = [str(correct)]
     while len(options) < 4:
-        wrong = correct + random.choice([-2, -1, 1, 2]) * step
+        wrong = correct + rng.choice([-2, -1, 1, 2]) * step
         if str(wrong) not in options and wrong > 0:
             options.append(str(wrong))
-    random.shuffle(options)
+    rng.shuffle(options)
     
     return {
         "type": "number",
@@ -49,65 +49,87 @@ def generate_number_pattern() -> dict:
     }
 
 
-def get_pattern_question(difficulty: str = "easy") -> dict:
-    """Generate a pattern recognition question."""
-    
-    # Randomly choose between word categories and number patterns
-    if random.random() < 0.4:
-        return generate_number_pattern()
-        
-    if difficulty == "easy":
-        num_examples = 3
-        num_options = 3
-    elif difficulty == "medium":
-        num_examples = 2
-        num_options = 4
-    else:
-        num_examples = 1
-        num_options = 4
-
-    target_cat = random.choice(list(CATEGORIES.keys()))
-    target_items = CATEGORIES[target_cat]
+# difficulty -> (examples shown, answer options)
+DIFFICULTY_SETTINGS = {"easy": (3, 3), "medium": (2, 4), "hard": (1, 4)}
+NUMBER_PATTERN_SHARE = 0.4
 
-    examples = []
-    for _ in range(num_examples):
-        cat = random.choice(list(CATEGORIES.keys()))
-        item = random.choice(CATEGORIES[cat])
-        examples.append({"item": item, "category": cat})
-
-    question_item = random.choice([i for i in target_items if i not in [e["item"] for e in examples]])
-
-    other_cats = [c for c in CATEGORIES.keys() if c != target_cat]
-    wrong_cats = random.sample(other_cats, min(num_options - 1, len(other_cats)))
-    options = [target_cat] + wrong_cats
-    random.shuffle(options)
 
+def _word_question(q: dict, difficulty: str, rng, bank: dict) -> dict:
+    num_examples, num_options = DIFFICULTY_SETTINGS.get(difficulty, DIFFICULTY_SETTINGS["hard"])
+    target_cat = q["category"]
+    examples = [
+        {"item": e["item"], "category": e["category"]}
+        for e in rng.sample(bank["items"], min(num_examples + 1, len(bank["items"]))) if e is not q
+    ][:num_examples]
+    other_cats = bank["others"][target_cat]
+    options = [target_cat] + rng.sample(other_cats, min(num_options - 1, len(other_cats)))
+    rng.shuffle(options)
     return {
         "type": "word",
         "examples": examples,
-        "question_item": question_item,
+        "question_item": q["item"],
         "correct_answer": target_cat,
         "options": options
     }
 
 
+def get_pattern_question(difficulty: str = "easy") -> dict:
+    """
+    Generate a pattern recognition question. Items come from the whole bank as they
+    did before difficulty pools; `difficulty` only sets the examples and options.
+    """
+    return get_pattern_questions(1, difficulty, pooled=False)[0]
+
+
+def get_pattern_questions(n: int, difficulty: str = "easy", rng=random, pooled: bool = True) -> list:
+    """
+    Up to `n` questions with distinct items: a share are number sequences, the rest
+    word items drawn without replacement from the difficulty's pool (the whole bank
+    when `pooled` is False).
+    """
+    # Randomly choose between word categories and number patterns
+    kinds = ["number" if rng.random() < NUMBER_PATTERN_SHARE else "word" for _ in range(n)]
+    words = iter(PATTERN_BANK.sample(kinds.count("word"), rng, difficulty if pooled else None))
+    bank = PATTERN_BANK.snapshot().derived
+    questions, seen = [], set()
+    for kind in kinds:
+        q = next(words, None) if kind == "word" else None
+        if q is not None:
+            questions.append(_word_question(q, difficulty, rng, bank))
+            continue
+        # Number sequences, also used once the word pool runs out
+        for _ in range(20):
+            question = generate_number_pattern(rng)
+            if question["question_item"] not in seen:
+                seen.add(question["question_item"])
+                questions.append(question)
+                break
+    return questions
+
+
 def check_pattern_answer(question_item: str, answer: str) -> dict:
     """Check a pattern recognition answer."""
     # Check if it was a number sequence (has spaces and digits)
     if " " in question_item and any(c.isdigit() for c in question_item):
-        nums = list(map(int, question_item.split()))
-        step = nums[1] - nums[0]
+        try:
+            nums = list(map(int, question_item.split()))
+            step = nums[1] - nums[0]
+        except (ValueError, IndexError):
+            return {"is_correct": False, "invalid": True, "xp_earned": 0, "feedback": "Invalid question."}
         correct = str(nums[-1] + step)
         is_correct = (answer == correct)
         return {
             "is_correct": is_correct,
             "correct_answer": correct,
             "xp_earned": 20 if is_correct else 0,
+            "generated": True,  # not from the bank, so the server cannot tell it issued this sequence
             "feedback": f"✅ Correct! The pattern increases by {step}." if is_correct else f"❌ Not quite. The next number is {correct}."
         }
         
-    v = ITEM_TO_CATEGORY.get(question_item)
-    correct = v
+    q = PATTERN_BANK.get(question_item)
+    if q is None:
+        return {"is_correct": False, "invalid": True, "xp_earned": 0, "feedback": "Question not found."}
+    correct = q["category"]
     is_correct = (answer == correct)
     xp_earned = 20 if is_correct else 0
     return {
@@ -0,0 +1,182 @@
+"""
+Question banks for the quiz worlds.
+
+Each bank is a JSON list of question objects in simulation/data (or
+QUESTION_BANK_DIR). Banks load on first use, index every question by a stable
+id (the "id" field, or the key field when there is none) and optionally by a
+secondary key such as the prompt text, so serving and grading are dict lookups.
+Questions are also grouped into per-difficulty pools at load time ("difficulty"
+field; untagged questions join every pool) for sampling without replacement.
+The file's mtime is re-checked at most every QUESTION_BANK_RELOAD_SECONDS; an
+edited file is reloaded and swapped in whole, and a broken edit keeps the
+previous version serving. `reload_all` builds every bank before swapping any,
+so one broken file leaves all banks on their previous versions.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("QUESTION_BANK_DIR", os.path.join(os.path.dirname(__file__), "data"))
+RELOAD_CHECK_SECONDS = float(os.getenv("QUESTION_BANK_RELOAD_SECONDS", "2"))
+DIFFICULTIES = ("easy", "medium", "hard")
+
+
+class QuestionBankError(ValueError):
+    """Raised when a bank file is missing, malformed or has duplicate ids or keys."""
+
+
+@dataclass
+class Snapshot:
+    """One loaded version of a bank. Never mutated after it is built."""
+    questions: list
+    by_id: dict
+    by_key: dict
+    mtime: float
+    pools: dict = field(default_factory=dict)  # difficulty -> questions; None -> all of them
+    derived: dict = field(default_factory=dict)  # whatever the bank's `prepare` hook precomputed
+
+
+class QuestionBank:
+    def __init__(self, name: str, filename: str, key: Optional[str] = None, prepare: Optional[Callable] = None):
+        self.name = name
+        self.path = os.path.join(DATA_DIR, filename)
+        self.key = key
+        self.prepare = prepare
+        self._snapshot: Optional[Snapshot] = None
+        self._checked_at = 0.0
+        self._failed_mtime = None  # mtime of a broken edit, so it is reported once, not on every check
+        self._lock = threading.Lock()
+
+    def _build(self, mtime: float) -> Snapshot:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                questions = json.load(f)
+        except (OSError, ValueError) as e:
+            raise QuestionBankError(f"{self.name} bank: cannot load {self.path}: {e}") from e
+        if not isinstance(questions, list) or not questions:
+            raise QuestionBankError(f"{self.name} bank: expected a non-empty JSON list")
+        by_id, by_key = {}, {}
+        for q in questions:
+            qid = q.get("id", q.get(self.key))
+            if qid is None:
+                raise QuestionBankError(f"{self.name} bank: question without an id: {q!r:.80}")
+            if qid in by_id:
+                raise QuestionBankError(f"{self.name} bank: duplicate id {qid!r}")
+            q["id"] = qid
+            by_id[qid] = q
+            if self.key:
+                key = q.get(self.key)
+                if key is None:
+                    raise QuestionBankError(f"{self.name} bank: question {qid!r} has no {self.key!r}")
+                if key in by_key:
+                    raise QuestionBankError(f"{self.name} bank: duplicate {self.key} {key!r:.80}")
+                by_key[key] = q
+        tagged = {q["difficulty"] for q in questions if q.get("difficulty")}
+        pools = {None: questions}
+        for difficulty in (*DIFFICULTIES, *sorted(tagged - set(DIFFICULTIES))):
+            pools[difficulty] = [q for q in questions if q.get("difficulty") in (None, difficulty)]
+        snapshot = Snapshot(questions, by_id, by_key, mtime, pools)
+        if self.prepare:
+            snapshot.derived = self.prepare(questions)
+        return snapshot
+
+    def snapshot(self) -> Snapshot:
+        """The current version, loading or reloading the file when needed."""
+        current = self._snapshot
+        now = time.monotonic()
+        if current is not None and (RELOAD_CHECK_SECONDS <= 0 or now - self._checked_at < RELOAD_CHECK_SECONDS):
+            return current
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                if self._snapshot is None:
+                    raise QuestionBankError(f"{self.name} bank: {self.path} not found")
+                return self._snapshot
+            if self._snapshot is None or mtime not in (self._snapshot.mtime, self._failed_mtime):
+                self._load(mtime)
+            return self._snapshot
+
+    def _load(self, mtime: float):
+        try:
+            snapshot = self._build(mtime)
+        except QuestionBankError as e:
+            if self._snapshot is None:
+                raise
+            self._failed_mtime = mtime
+            logger.error("%s; keeping the previous version", e)
+            return
+        if self._snapshot is not None:
+            logger.info("reloaded %s bank (%d questions)", self.name, len(snapshot.questions))
+        self._snapshot = snapshot
+
+    def rebuild(self) -> Snapshot:
+        """Build a fresh version from the file without swapping it in; raises QuestionBankError if it is bad."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            raise QuestionBankError(f"{self.name} bank: {e}") from e
+        return self._build(mtime)
+
+    def swap(self, snapshot: Snapshot):
+        with self._lock:
+            self._snapshot = snapshot
+            self._failed_mtime = None
+            self._checked_at = time.monotonic()
+
+    def reload(self) -> int:
+        """Reload now; raises QuestionBankError (and keeps serving the old version) if the file is bad."""
+        snapshot = self.rebuild()
+        self.swap(snapshot)
+        return len(snapshot.questions)
+
+    def __len__(self):
+        return len(self.snapshot().questions)
+
+    def get(self, question_id) -> Optional[dict]:
+        return self.snapshot().by_id.get(question_id)
+
+    def find(self, key) -> Optional[dict]:
+        """Look a question up by its secondary key (e.g. the prompt text)."""
+        return self.snapshot().by_key.get(key)
+
+    def sample(self, n: int, rng=random, difficulty: Optional[str] = None) -> list:
+        """Up to `n` distinct questions from the difficulty's pool (all questions for an unknown one)."""
+        pools = self.snapshot().pools
+        pool = pools.get(difficulty) or pools[None]
+        return rng.sample(pool, min(n, len(pool)))
+
+
+BANKS = {}
+
+
+def register(bank: QuestionBank) -> QuestionBank:
+    BANKS[bank.name] = bank
+    return bank
+
+
+def reload_all() -> dict:
+    """
+    Reload every bank, all or nothing: each file is built first and the new
+    versions are swapped in only if every one loaded. Raises QuestionBankError
+    naming each broken bank otherwise.
+    """
+    snapshots, errors = {}, []
+    for name, bank in BANKS.items():
+        try:
+            snapshots[name] = bank.rebuild()
+        except QuestionBankError as e:
+            errors.append(str(e))
+    if errors:
+        raise QuestionBankError("; ".join(errors))
+    for name, snapshot in snapshots.items():
+        BANKS[name].swap(snapshot)
+    return {name: len(snapshot.questions) for name, snapshot in snapshots.items()}
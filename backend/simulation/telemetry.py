@@ -0,0 +1,176 @@
+import threading
+from contextvars import ContextVar
+
+# Route label for whatever request is currently being served. Set by the HTTP
+# middleware in main.py so deep callers (e.g. ollama_client) can tag metrics.
+current_route: ContextVar[str] = ContextVar("current_route", default="unknown")
+
+# Buckets in seconds, tuned for local LLM calls (fast cached loads up to slow cold starts)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_RATE_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter keyed by a fixed set of label names."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback at scrape time."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, *label_values, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.callback is not None:
+            lines.append(f"{self.name} {_format_number(self.callback())}")
+            return lines
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition layout."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values, value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                self._series[label_values] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = f'le="{_format_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+                inf = _format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_number(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+_registry = []
+
+
+def register(metric):
+    """Add a metric to the /metrics exposition and return it."""
+    _registry.append(metric)
+    return metric
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ===================== Ollama inference metrics =====================
+_LABELS = ("model", "route")
+
+OLLAMA_REQUESTS = register(Counter(
+    "promptquest_ollama_requests_total", "Ollama generate calls by outcome.", ("model", "route", "outcome")))
+OLLAMA_QUEUE_WAIT = register(Histogram(
+    "promptquest_ollama_queue_wait_seconds", "Wall time not accounted for by Ollama's total_duration (queueing + transport).", _LABELS))
+OLLAMA_LOAD = register(Histogram(
+    "promptquest_ollama_load_seconds", "Model load time reported by Ollama (load_duration).", _LABELS))
+OLLAMA_PROMPT_EVAL = register(Histogram(
+    "promptquest_ollama_prompt_eval_seconds", "Prefill time reported by Ollama (prompt_eval_duration).", _LABELS))
+OLLAMA_EVAL = register(Histogram(
+    "promptquest_ollama_eval_seconds", "Decode time reported by Ollama (eval_duration).", _LABELS))
+OLLAMA_TOTAL = register(Histogram(
+    "promptquest_ollama_total_seconds", "Total generation time reported by Ollama (total_duration).", _LABELS))
+OLLAMA_DECODE_RATE = register(Histogram(
+    "promptquest_ollama_decode_tokens_per_second", "Decode throughput (eval_count / eval_duration).", _LABELS, TOKEN_RATE_BUCKETS))
+OLLAMA_PROMPT_TOKENS = register(Counter(
+    "promptquest_ollama_prompt_tokens_total", "Prompt tokens evaluated (prompt_eval_count).", _LABELS))
+OLLAMA_EVAL_TOKENS = register(Counter(
+    "promptquest_ollama_eval_tokens_total", "Tokens generated (eval_count).", _LABELS))
+
+
+def record_generation(model: str, stats: dict, wall_seconds: float, route: str = None):
+    """Aggregate the timings of one successful Ollama call. Durations in `stats` are nanoseconds."""
+    route = route or current_route.get()
+    total = stats.get("total_duration", 0) / 1e9
+    eval_seconds = stats.get("eval_duration", 0) / 1e9
+    eval_count = stats.get("eval_count", 0)
+
+    OLLAMA_REQUESTS.inc(model, route, "success")
+    OLLAMA_QUEUE_WAIT.observe(model, route, value=max(0.0, wall_seconds - total))
+    OLLAMA_LOAD.observe(model, route, value=stats.get("load_duration", 0) / 1e9)
+    OLLAMA_PROMPT_EVAL.observe(model, route, value=stats.get("prompt_eval_duration", 0) / 1e9)
+    OLLAMA_EVAL.observe(model, route, value=eval_seconds)
+    OLLAMA_TOTAL.observe(model, route, value=total)
+    if eval_seconds > 0:
+        OLLAMA_DECODE_RATE.observe(model, route, value=eval_count / eval_seconds)
+    OLLAMA_PROMPT_TOKENS.inc(model, route, amount=stats.get("prompt_eval_count", 0))
+    OLLAMA_EVAL_TOKENS.inc(model, route, amount=eval_count)
+
+
+def record_failure(model: str, outcome: str, route: str = None):
+    OLLAMA_REQUESTS.inc(model, route or current_route.get(), outcome)
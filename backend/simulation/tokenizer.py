@@ -1,14 +1,22 @@
 import re
 
+from .bpe import BUNDLED_VOCAB_DIR, VOCAB_DIR, get_tokenizer
+
+# The bundled vocab is trained on this repo's text; only BPE_VOCAB_DIR files match a real model
+SUBWORD_VOCAB = "bundled" if VOCAB_DIR == BUNDLED_VOCAB_DIR else "custom"
+
 def tokenize(text: str) -> dict:
     """
-    Tokenizer simulating Word, Character, and Subword BPE tokenization.
+    Word and Character tokenization side by side with real byte-level BPE subwords.
+    `subword_vocab` says whether the subwords come from the bundled demo vocabulary
+    or from files configured with BPE_VOCAB_DIR.
     """
     if not text.strip():
         return {
             "word_tokens": [],
             "char_tokens": [],
             "subword_tokens": [],
+            "subword_vocab": SUBWORD_VOCAB,
             "stats": {"token_count": 0, "char_count": 0}
         }
 
@@ -18,23 +26,11 @@ def tokenize(text: str) -> dict:
     # Character Tokens (skip spaces)
     raw_chars = [c for c in text if c.strip()]
     
-    # Subword Tokens (mocking BPE logic)
-    subwords = []
-    vowels = set('aeiouyAEIOUY')
-    for word in raw_words:
-        if len(word) > 4 and word.isalpha():
-            # Mock split word if it's long
-            mid = len(word) // 2 + 1
-            subwords.append(word[:mid])
-            subwords.append("##" + word[mid:])
-        elif word.lower().endswith("ing") and len(word) > 4:
-            subwords.append(word[:-3])
-            subwords.append("##ing")
-        elif word.lower().endswith("ed") and len(word) > 3:
-            subwords.append(word[:-2])
-            subwords.append("##ed")
-        else:
-            subwords.append(word)
+    # Subword Tokens: byte-level BPE, the same scheme GPT-style models use
+    bpe = get_tokenizer()
+    token_ids = bpe.encode(text)
+    # Decoded one by one, a token holding part of a character (e.g. half an emoji) shows as <0x..> bytes
+    subwords = [bpe.token_text(token_id) for token_id in token_ids]
 
     token_colors = [
         "#FF6B6B", "#4ECDC4", "#45B7D1", "#96CEB4",
@@ -51,12 +47,17 @@ def tokenize(text: str) -> dict:
             } for i, tok in enumerate(t_list)
         ]
 
+    subword_tokens = add_meta(subwords)
+    for tok, token_id in zip(subword_tokens, token_ids):
+        tok["token_id"] = token_id
+
     return {
         "word_tokens": add_meta(raw_words),
         "char_tokens": add_meta(raw_chars),
-        "subword_tokens": add_meta(subwords),
+        "subword_tokens": subword_tokens,
+        "subword_vocab": SUBWORD_VOCAB,
         "stats": {
-            "token_count": len(subwords),
+            "token_count": len(token_ids),
             "char_count": len(text),
             "compression_ratio": round(len(text) / max(len(subwords), 1), 2)
         }
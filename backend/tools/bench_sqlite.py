@@ -0,0 +1,142 @@
+"""
+Concurrent write benchmark for the SQLite storage profiles.
+
+Runs the /mistake, /prompt-history and /xp write patterns from many concurrent
+tasks (plus a few readers) against a scratch database, once with the stock
+aiosqlite engine (rollback journal, deferred transactions) and once with the
+tuned profile from database.config, and prints throughput, latency and
+"database is locked" errors for each (writer and reader errors counted apart).
+
+    python -m tools.bench_sqlite --writers 32 --ops 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database.config import StorageSettings, create_engines
+from database.db import Base
+from database.models import Mistake, PromptHistory, User
+from tools.loadtest import percentile
+
+TOPICS = ["pattern", "prediction", "tokenization", "hallucination", "prompt"]
+
+
+async def _write_op(session_factory, user_id: int):
+    async with session_factory() as db:
+        kind = random.random()
+        if kind < 0.4:
+            topic = random.choice(TOPICS)
+            result = await db.execute(select(Mistake).where(Mistake.user_id == user_id, Mistake.topic == topic))
+            mistake = result.scalar_one_or_none()
+            if mistake:
+                mistake.count += 1
+            else:
+                db.add(Mistake(user_id=user_id, topic=topic, count=1))
+        elif kind < 0.8:
+            db.add(PromptHistory(user_id=user_id, prompt_text="benchmark prompt", score=random.randint(0, 100),
+                                 grade="B", grade_label="Good"))
+        else:
+            user = await db.get(User, user_id)
+            user.xp += 10
+        await db.commit()
+
+
+async def _read_op(session_factory, user_id: int):
+    async with session_factory() as db:
+        result = await db.execute(select(PromptHistory).where(PromptHistory.user_id == user_id).limit(50))
+        result.scalars().all()
+
+
+async def run_profile(name: str, write_engine, read_engine, writers: int, readers: int, ops: int, users: int) -> dict:
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    write_sessions = async_sessionmaker(bind=write_engine, class_=AsyncSession, autoflush=False)
+    read_sessions = async_sessionmaker(bind=read_engine, class_=AsyncSession, autoflush=False)
+    async with write_sessions() as db:
+        db.add_all([User(id=i, username=f"bench{i}", xp=0) for i in range(1, users + 1)])
+        await db.commit()
+
+    write_latencies, read_latencies = [], []
+    # Counted per side, so failed reads never show up as failed writes
+    write_errors = {"locked": 0, "other": 0}
+    read_errors = {"locked": 0, "other": 0}
+
+    async def timed(op, factory, latencies, errors):
+        started = time.perf_counter()
+        try:
+            await op(factory, random.randint(1, users))
+        except OperationalError as e:
+            errors["locked" if "locked" in str(e) else "other"] += 1
+        except Exception:
+            # e.g. MultipleResultsFound when two racing check-then-inserts both inserted
+            errors["other"] += 1
+        latencies.append(time.perf_counter() - started)
+
+    async def writer():
+        for _ in range(ops):
+            await timed(_write_op, write_sessions, write_latencies, write_errors)
+
+    async def reader():
+        for _ in range(ops):
+            await timed(_read_op, read_sessions, read_latencies, read_errors)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[writer() for _ in range(writers)], *[reader() for _ in range(readers)])
+    elapsed = time.perf_counter() - started
+
+    await write_engine.dispose()
+    if read_engine is not write_engine:
+        await read_engine.dispose()
+
+    write_latencies.sort()
+    read_latencies.sort()
+    ok_writes = len(write_latencies) - write_errors["locked"] - write_errors["other"]
+    return {
+        "profile": name,
+        "writes_per_s": round(ok_writes / elapsed, 1),
+        "write_p50_ms": round(percentile(write_latencies, 50) * 1000, 1),
+        "write_p99_ms": round(percentile(write_latencies, 99) * 1000, 1),
+        "read_p99_ms": round(percentile(read_latencies, 99) * 1000, 1),
+        "locked_errors": write_errors["locked"],
+        "other_errors": write_errors["other"],
+        "read_errors": read_errors["locked"] + read_errors["other"],
+    }
+
+
+async def main_async(args):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'baseline.db')}"
+        baseline = create_async_engine(url, connect_args={"check_same_thread": False, "timeout": args.busy_timeout_ms / 1000})
+        results.append(await run_profile("baseline", baseline, baseline, args.writers, args.readers, args.ops, args.users))
+
+        settings = StorageSettings(url=f"sqlite+aiosqlite:///{os.path.join(tmp, 'tuned.db')}", busy_timeout_ms=args.busy_timeout_ms)
+        write_engine, read_engine = create_engines(settings)
+        results.append(await run_profile("tuned", write_engine, read_engine, args.writers, args.readers, args.ops, args.users))
+
+    print(f"writers={args.writers} readers={args.readers} ops/task={args.ops} users={args.users}")
+    print(f"{'profile':<10} {'writes/s':>9} {'w p50ms':>9} {'w p99ms':>9} {'r p99ms':>9} {'locked':>7} {'other':>6} {'r err':>6}")
+    for r in results:
+        print(f"{r['profile']:<10} {r['writes_per_s']:>9} {r['write_p50_ms']:>9} {r['write_p99_ms']:>9} "
+              f"{r['read_p99_ms']:>9} {r['locked_errors']:>7} {r['other_errors']:>6} {r['read_errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent SQLite writes: stock engine vs tuned profile.")
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=50, help="Operations per task")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--busy-timeout-ms", type=int, default=5000)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
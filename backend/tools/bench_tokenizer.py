@@ -0,0 +1,68 @@
+"""
+Throughput benchmark: byte-level BPE tokenizer vs the old mock subword splitter.
+
+Encodes the same text with the mock (regex words, long words cut in half), with
+BPE on a cold cache (every piece merged from scratch) and with BPE on a warm
+LRU cache, and prints MB/s and token counts for each.
+
+    python -m tools.bench_tokenizer --file ../README.md --repeat 50
+"""
+import argparse
+import re
+import time
+
+from simulation.bpe import BPETokenizer, VOCAB_DIR
+
+
+def mock_subwords(text: str) -> list:
+    """The splitter simulation.tokenizer used before the BPE engine, kept for comparison."""
+    subwords = []
+    for word in re.findall(r"[A-Za-z]+|[0-9]+|[^\s\w]", text):
+        if len(word) > 4 and word.isalpha():
+            mid = len(word) // 2 + 1
+            subwords += [word[:mid], "##" + word[mid:]]
+        elif word.lower().endswith("ing") and len(word) > 4:
+            subwords += [word[:-3], "##ing"]
+        elif word.lower().endswith("ed") and len(word) > 3:
+            subwords += [word[:-2], "##ed"]
+        else:
+            subwords.append(word)
+    return subwords
+
+
+def timed(fn, text: str):
+    start = time.perf_counter()
+    tokens = fn(text)
+    return time.perf_counter() - start, len(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BPE tokenizer against the old mock.")
+    parser.add_argument("--file", default="../README.md", help="Text to tokenize")
+    parser.add_argument("--repeat", type=int, default=50, help="Concatenate the file this many times")
+    parser.add_argument("--vocab", default=VOCAB_DIR)
+    args = parser.parse_args()
+
+    with open(args.file, encoding="utf-8") as f:
+        text = f.read() * args.repeat
+    megabytes = len(text.encode("utf-8")) / 1e6
+
+    tokenizer = BPETokenizer.from_dir(args.vocab)
+    uncached = BPETokenizer.from_dir(args.vocab, cache_size=0)
+    runs = [
+        ("mock (half-word split)", mock_subwords),
+        ("bpe, no cache", uncached.encode),
+        ("bpe, cold LRU", tokenizer.encode),
+        ("bpe, warm LRU", tokenizer.encode),
+    ]
+    print(f"{megabytes:.2f} MB of text, vocab of {len(tokenizer.encoder)}")
+    print(f"{'tokenizer':<24}{'seconds':>10}{'MB/s':>10}{'tokens':>12}")
+    for name, fn in runs:
+        seconds, count = timed(fn, text)
+        print(f"{name:<24}{seconds:>10.3f}{megabytes / seconds:>10.2f}{count:>12}")
+    info = tokenizer.encode_piece.cache_info()
+    print(f"LRU: {info.currsize} pieces cached, {info.hits} hits, {info.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Verify that every hot query uses an index.
+
+Builds the schema and runs all migrations on a scratch SQLite database (or the
+one given with --url), then prints EXPLAIN QUERY PLAN for each query in
+database.query_plans.HOT_QUERIES. Exits non-zero if any query scans a table.
+
+    python -m tools.check_query_plans
+    python -m tools.check_query_plans --url sqlite+aiosqlite:///./promptquest.db
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.db import Base
+from database.migrations import run_migrations
+from database.query_plans import HOT_QUERIES, check_query_plans
+
+
+async def main_async(url: str, verbose: bool) -> int:
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        applied = await run_migrations(conn)
+        if applied:
+            print(f"applied migrations: {applied}")
+        failures = await check_query_plans(conn)
+        if verbose:
+            for name, stmt in HOT_QUERIES.items():
+                sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+                plan = [row[-1] for row in await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+                print(f"{name}: {' | '.join(plan)}")
+    await engine.dispose()
+
+    for name in HOT_QUERIES:
+        status = "FAIL" if name in failures else "ok"
+        print(f"{status:<5} {name}" + (f"  ({'; '.join(failures[name])})" if name in failures else ""))
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that hot queries are served by an index.")
+    parser.add_argument("--url", help="Database to check (default: a scratch SQLite file). Migrations are applied to it.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print the full query plan for each query")
+    args = parser.parse_args()
+
+    if args.url:
+        sys.exit(asyncio.run(main_async(args.url, args.verbose)))
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'plans.db')}"
+        sys.exit(asyncio.run(main_async(url, args.verbose)))
+
+
+if __name__ == "__main__":
+    main()
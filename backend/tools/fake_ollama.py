@@ -0,0 +1,156 @@
+"""
+Fake Ollama server for offline performance work.
+
+Implements the two endpoints PromptQuest uses (/api/tags and /api/generate,
+streaming and non-streaming) with configurable latency, decode speed and
+failure injection. Responses carry the same timing fields real Ollama reports,
+so /metrics and the load-test harness behave as they would against a model.
+
+Usage (from backend/):
+    python -m tools.fake_ollama --port 11434 --latency-ms 50 --tokens-per-second 40
+    OLLAMA_BASE=http://localhost:11434 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class StubConfig:
+    models: list = field(default_factory=lambda: ["llama3.2"])
+    latency_ms: float = 20.0         # prefill / time to first token
+    load_ms: float = 0.0             # one-off cold load per model
+    tokens_per_second: float = 50.0  # decode speed
+    response_tokens: int = 32        # cap on generated tokens (num_predict also applies)
+    failure_rate: float = 0.0        # fraction of generate calls that fail
+    failure_status: int = 500
+
+
+CANNED_TEXT = (
+    "Large language models read text as tokens and predict the next token from "
+    "patterns learned during training. Attention lets every token look at every "
+    "other token so the model can resolve context before it answers."
+).split()
+
+# One object that satisfies every arcade game's expected JSON keys
+CANNED_JSON = {
+    "s": "The cat sat on the",
+    "a": "mat",
+    "p": "Could you please, if at all possible, kindly explain what tokens are?",
+    "diff": 9,
+    "target": "it",
+    "options": ["cat", "mat", "dog", "hat"],
+    "correct": "cat",
+    "exp": "This is a stub answer from the fake Ollama server.",
+}
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="Fake Ollama")
+    loaded = set()
+
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": m, "model": m, "size": 0} for m in config.models]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        payload = await request.json()
+        model = payload.get("model") or config.models[0]
+
+        if random.random() < config.failure_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=config.failure_status)
+
+        load_s = 0.0
+        if model not in loaded:
+            load_s = config.load_ms / 1000
+            loaded.add(model)
+
+        num_predict = payload.get("options", {}).get("num_predict") or config.response_tokens
+        if payload.get("format") == "json":
+            pieces = [json.dumps(CANNED_JSON)]
+        else:
+            count = min(config.response_tokens, num_predict)
+            words = [CANNED_TEXT[i % len(CANNED_TEXT)] for i in range(count)]
+            pieces = words[:1] + [" " + w for w in words[1:]]
+        prompt_tokens = len(str(payload.get("prompt", "")).split()) + len(str(payload.get("system", "")).split())
+        prefill_s = config.latency_ms / 1000
+        per_token_s = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        def stats(started: float, decode_s: float) -> dict:
+            return {
+                "total_duration": int((time.perf_counter() - started) * 1e9),
+                "load_duration": int(load_s * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prefill_s * 1e9),
+                "eval_count": len(pieces),
+                "eval_duration": int(decode_s * 1e9),
+            }
+
+        if not payload.get("stream", True):
+            started = time.perf_counter()
+            await asyncio.sleep(load_s + prefill_s + per_token_s * len(pieces))
+            return {
+                "model": model,
+                "created_at": _now(),
+                "response": "".join(pieces),
+                "done": True,
+                "done_reason": "stop",
+                **stats(started, per_token_s * len(pieces)),
+            }
+
+        async def stream():
+            started = time.perf_counter()
+            await asyncio.sleep(load_s + prefill_s)
+            decode_started = time.perf_counter()
+            for piece in pieces:
+                await asyncio.sleep(per_token_s)
+                yield json.dumps({"model": model, "created_at": _now(), "response": piece, "done": False}) + "\n"
+            final = {"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "stop"}
+            final.update(stats(started, time.perf_counter() - decode_started))
+            yield json.dumps(final) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for offline load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", default="llama3.2", help="Comma-separated model names reported by /api/tags")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Prefill latency before the first token")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="Cold load time on first use of each model")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--response-tokens", type=int, default=32)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of generate calls that fail (0-1)")
+    parser.add_argument("--failure-status", type=int, default=500)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        latency_ms=args.latency_ms,
+        load_ms=args.load_ms,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
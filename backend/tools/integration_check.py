@@ -0,0 +1,108 @@
+"""
+Run the analytics and gamification routes end to end against each database backend.
+
+The engine is built from PROMPTQUEST_DB_* at import time, so every profile runs
+in its own subprocess. The SQLite profile uses a scratch file; the PostgreSQL
+profile needs a disposable server (and `pip install asyncpg`), e.g.
+
+    docker run --rm -d --name pq-pg -p 5433:5432 -e POSTGRES_PASSWORD=pq postgres:16
+    python -m tools.integration_check --pg-url postgresql+asyncpg://postgres:pq@127.0.0.1:5433/postgres
+
+Without --pg-url (or PROMPTQUEST_TEST_PG_URL) only the SQLite profile runs.
+"""
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import uuid
+
+
+def scenario():
+    """Exercise every analytics and gamification route once, failing loudly on any mismatch."""
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    checks = []
+
+    def check(name, condition, detail=""):
+        checks.append(name)
+        if not condition:
+            raise AssertionError(f"{name} failed {detail}")
+
+    with TestClient(app) as client:
+        username = f"it-{uuid.uuid4().hex[:8]}"
+        login = client.post("/api/gamification/login", json={"username": username, "password": "correct-horse"})
+        check("login", login.status_code == 200, login.text)
+        client.headers["Authorization"] = f"Bearer {login.json()['token']}"
+
+        admin = {"X-Admin-Token": os.environ["PROMPTQUEST_ADMIN_TOKEN"]}
+        xp = client.post("/api/gamification/xp", params={"amount": 40}, headers=admin).json()
+        check("add xp", xp["total_xp"] == 40, xp)
+        first = client.post("/api/gamification/world", params={"world_id": 3}).json()
+        again = client.post("/api/gamification/world", params={"world_id": 3}).json()
+        check("complete world once", first["message"] != again["message"], (first, again))
+        progress = client.get("/api/gamification/progress").json()
+        check("progress", progress == {"xp": 40, "completed_worlds": [3], "badges": ["token_master"]}, progress)
+        renamed = client.put("/api/gamification/username", json={"username": username + "-r"})
+        check("rename", renamed.status_code == 200, renamed.text)
+
+        for topic in ["pattern", "pattern", "prediction"]:
+            client.post("/api/analytics/mistake", json={"topic": topic})
+        summary = client.get("/api/analytics/summary").json()
+        check("mistake upsert", summary["mistakes"] == {"pattern": 2, "prediction": 1}, summary)
+
+        for score in [40, 85, 90]:
+            saved = client.post("/api/analytics/prompt-history",
+                                json={"prompt": "p", "score": score, "grade": "B", "grade_label": "Good"})
+            check("save prompt", saved.status_code == 200, saved.text)
+        page = client.get("/api/analytics/prompt-history", params={"limit": 2}).json()
+        check("history page", len(page["history"]) == 2 and page["next_cursor"] is not None, page)
+        rest = client.get("/api/analytics/prompt-history", params={"limit": 2, "cursor": page["next_cursor"]}).json()
+        check("history cursor", len(rest["history"]) == 1, rest)
+        stats = client.get("/api/analytics/stats").json()["stats"]
+        check("score stats", stats["count"] == 3 and stats["best_streak"] == 2, stats)
+
+        scoped = client.delete("/api/analytics/reset", params={"topic": "pattern"}).json()
+        check("scoped reset", scoped["deleted"] == {"mistakes": 1, "prompt_history": 0}, scoped)
+        full = client.delete("/api/analytics/reset").json()
+        check("full reset", full["deleted"] == {"mistakes": 1, "prompt_history": 3}, full)
+
+    print(f"{len(checks)} checks passed")
+
+
+def run_profile(name: str, url: str) -> bool:
+    env = dict(os.environ, PROMPTQUEST_DB_URL=url)
+    env["PROMPTQUEST_ADMIN_TOKEN"] = env.get("PROMPTQUEST_ADMIN_TOKEN") or secrets.token_hex(16)
+    print(f"== {name}: {url}")
+    completed = subprocess.run([sys.executable, "-m", "tools.integration_check", "--run-scenario"], env=env)
+    return completed.returncode == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the analytics/gamification routes against SQLite and PostgreSQL.")
+    parser.add_argument("--pg-url", default=os.getenv("PROMPTQUEST_TEST_PG_URL", ""),
+                        help="postgresql+asyncpg:// URL of a disposable database")
+    parser.add_argument("--skip-sqlite", action="store_true")
+    parser.add_argument("--run-scenario", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        scenario()
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.skip_sqlite:
+            results["sqlite"] = run_profile("sqlite", f"sqlite+aiosqlite:///{os.path.join(tmp, 'integration.db')}")
+        if args.pg_url:
+            results["postgresql"] = run_profile("postgresql", args.pg_url)
+    for name, ok in results.items():
+        print(f"{'ok' if ok else 'FAIL':<5} {name}")
+    sys.exit(0 if results and all(results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+End-to-end load test for the Ollama-backed endpoints.
+
+Drives /api/ollama/* and /api/playground/arcade-generate at a fixed concurrency
+and reports p50/p95/p99 latency, throughput and errors per endpoint. Pair it
+with tools.fake_ollama to measure the backend without a real model:
+
+    python -m tools.fake_ollama --port 11500 &
+    OLLAMA_BASE=http://127.0.0.1:11500 uvicorn main:app --port 8000 &
+    python -m tools.loadtest --base http://127.0.0.1:8000 --concurrency 32 --requests 500
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict
+
+import httpx
+
+SCENARIOS = {
+    "status": ("GET", "/api/ollama/status", None),
+    "generate": ("POST", "/api/ollama/generate", {"prompt": "Explain tokenization in one paragraph.", "max_tokens": 64}),
+    "compare": ("POST", "/api/ollama/compare", {"prompt": "What is attention?", "max_tokens": 64}),
+    "generate-ui": ("POST", "/api/ollama/generate-ui", {"prompt": "A counter button"}),
+    "arcade": ("POST", "/api/playground/arcade-generate", {"game_id": "autoregressor", "level": 3, "score": 120}),
+}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _is_error(response: httpx.Response) -> str:
+    """Return an error label for a failed call, or '' on success."""
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    try:
+        body = response.json()
+    except json.JSONDecodeError:
+        return "invalid_json"
+    if isinstance(body, dict) and (body.get("error") or body.get("success") is False):
+        return "app_error"
+    return ""
+
+
+async def run(base: str, scenarios: list, concurrency: int, total: int, timeout: float) -> dict:
+    latencies = defaultdict(list)
+    errors = defaultdict(lambda: defaultdict(int))
+    plan = itertools.islice(itertools.cycle(scenarios), total)
+    lock = asyncio.Lock()
+
+    async def worker(client: httpx.AsyncClient):
+        while True:
+            async with lock:
+                name = next(plan, None)
+            if name is None:
+                return
+            method, path, body = SCENARIOS[name]
+            started = time.perf_counter()
+            try:
+                r = await client.request(method, path, json=body)
+                error = _is_error(r)
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            latencies[name].append(time.perf_counter() - started)
+            if error:
+                errors[name][error] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    report = {"elapsed_s": round(elapsed, 2), "concurrency": concurrency, "endpoints": {}}
+    for name in scenarios:
+        values = sorted(latencies[name])
+        report["endpoints"][name] = {
+            "requests": len(values),
+            "errors": dict(errors[name]),
+            "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"concurrency={report['concurrency']}  elapsed={report['elapsed_s']}s")
+    print(f"{'endpoint':<12} {'reqs':>6} {'rps':>8} {'p50ms':>9} {'p95ms':>9} {'p99ms':>9} {'maxms':>9}  errors")
+    for name, row in report["endpoints"].items():
+        errors = ", ".join(f"{k}={v}" for k, v in row["errors"].items()) or "-"
+        print(f"{name:<12} {row['requests']:>6} {row['rps']:>8} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+              f"{row['p99_ms']:>9} {row['max_ms']:>9}  {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the PromptQuest Ollama endpoints.")
+    parser.add_argument("--base", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Total requests across all scenarios")
+    parser.add_argument("--scenarios", default="generate,compare,arcade,status",
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    report = asyncio.run(run(args.base, scenarios, args.concurrency, args.requests, args.timeout))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Train the byte-level BPE vocabulary used by simulation.bpe.
+
+Counts pre-tokenized pieces across the given files or directories, then
+repeatedly merges the most frequent adjacent pair, updating pair counts only
+for the words that contain it. Writes GPT-2 style vocab.json and merges.txt.
+
+    python -m tools.train_bpe ../README.md ../frontend/src simulation --merges 4000
+"""
+import argparse
+import heapq
+import json
+import os
+from collections import Counter, defaultdict
+
+from simulation.bpe import BYTE_ENCODER, PRETOKENIZE, VOCAB_DIR
+
+TEXT_EXTENSIONS = (".md", ".txt", ".json", ".py", ".js", ".jsx")
+END_OF_TEXT = "<|endoftext|>"
+
+
+def iter_files(paths: list):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in ("node_modules", "__pycache__", "bpe") and not d.startswith("."))
+            for name in sorted(files):
+                if name.endswith(TEXT_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+
+def count_pieces(paths: list) -> Counter:
+    counts = Counter()
+    for path in iter_files(paths):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            counts.update(PRETOKENIZE.findall(f.read()))
+    return Counter({
+        piece.encode("utf-8").decode("latin-1").translate(BYTE_ENCODER): n for piece, n in counts.items()
+    })
+
+
+def train(piece_counts: Counter, num_merges: int, min_frequency: int = 2) -> list:
+    words = [list(piece) for piece in piece_counts]
+    freqs = list(piece_counts.values())
+    pair_counts = Counter()
+    where = defaultdict(set)  # pair -> indexes of words containing it
+    for idx, word in enumerate(words):
+        for pair in zip(word, word[1:]):
+            pair_counts[pair] += freqs[idx]
+            where[pair].add(idx)
+    # Max-heap with lazy invalidation: entries are re-checked against pair_counts when popped
+    heap = [(-count, pair) for pair, count in pair_counts.items()]
+    heapq.heapify(heap)
+
+    merges = []
+    while heap and len(merges) < num_merges:
+        neg_count, pair = heapq.heappop(heap)
+        if pair_counts.get(pair, 0) != -neg_count:
+            continue
+        if -neg_count < min_frequency:
+            break
+        merges.append(pair)
+        merged = pair[0] + pair[1]
+        touched = set()
+        for idx in where.pop(pair, ()):
+            word, freq = words[idx], freqs[idx]
+            for old in zip(word, word[1:]):
+                pair_counts[old] -= freq
+                touched.add(old)
+            i, out = 0, []
+            while i < len(word):
+                if i + 1 < len(word) and word[i] == pair[0] and word[i + 1] == pair[1]:
+                    out.append(merged)
+                    i += 2
+                else:
+                    out.append(word[i])
+                    i += 1
+            words[idx] = out
+            for new in zip(out, out[1:]):
+                pair_counts[new] += freq
+                where[new].add(idx)
+                touched.add(new)
+        pair_counts.pop(pair, None)
+        for p in touched:
+            if pair_counts.get(p, 0) > 0:
+                heapq.heappush(heap, (-pair_counts[p], p))
+    return merges
+
+
+def write_vocab(merges: list, out_dir: str):
+    os.makedirs(out_dir, exist_ok=True)
+    vocab = {BYTE_ENCODER[b]: b for b in range(256)}
+    for a, b in merges:
+        vocab.setdefault(a + b, len(vocab))
+    vocab[END_OF_TEXT] = len(vocab)
+    with open(os.path.join(out_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False, separators=(",", ":"))
+    with open(os.path.join(out_dir, "merges.txt"), "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+        f.writelines(f"{a} {b}\n" for a, b in merges)
+    return len(vocab)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a byte-level BPE vocabulary.")
+    parser.add_argument("paths", nargs="+", help="Files or directories of training text")
+    parser.add_argument("--merges", type=int, default=4000)
+    parser.add_argument("--out", default=VOCAB_DIR)
+    args = parser.parse_args()
+    counts = count_pieces(args.paths)
+    merges = train(counts, args.merges)
+    size = write_vocab(merges, args.out)
+    print(f"{len(counts)} distinct pieces, {len(merges)} merges, vocab of {size} -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -51,6 +51,9 @@ export function GameProvider({ children }) {
         }
     }, []);
 
+    // XP from server-graded answers is already saved; just show the server's total
+    const syncXP = useCallback((totalXP) => setXP(totalXP), []);
+
     const completeWorld = useCallback(async (worldId, earnedBadge) => {
         setCompletedWorlds(prev => prev.includes(worldId) ? prev : [...prev, worldId]);
         if (earnedBadge) {
@@ -127,7 +130,7 @@ export function GameProvider({ children }) {
 
     return (
         <GameContext.Provider value={{
-            xp, addXP,
+            xp, addXP, syncXP,
             completedWorlds, completeWorld,
             badges, playerName, setPlayerName,
             mistakes, recordMistake,
@@ -52,32 +52,56 @@ export default function Dashboard() {
     const ws = useRef(null);
 
     useEffect(() => {
-        // Connect to FastAPI WebSocket
-        ws.current = new WebSocket('ws://localhost:8000/ws/leaderboard');
+        // Connect to FastAPI WebSocket, reconnecting with exponential backoff if it drops
+        let closed = false;
+        let retryDelay = 1000;
+        let retryTimer = null;
 
-        ws.current.onmessage = (event) => {
-            try {
-                const message = JSON.parse(event.data);
-                if (message.type === 'xp_update') {
-                    const { user_id, username, xp: newXP } = message.data;
-                    setLeaderboard(prev => {
-                        const existing = prev.find(u => u.username === username);
-                        let updated;
-                        if (existing) {
-                            updated = prev.map(u => u.username === username ? { ...u, xp: newXP } : u);
-                        } else {
-                            updated = [...prev, { id: user_id, username, xp: newXP }];
-                        }
-                        // Sort by XP descending
-                        return updated.sort((a, b) => b.xp - a.xp).slice(0, 10);
-                    });
+        const connect = () => {
+            const socket = new WebSocket('ws://localhost:8000/ws/leaderboard');
+            ws.current = socket;
+
+            socket.onopen = () => {
+                retryDelay = 1000;
+            };
+
+            socket.onmessage = (event) => {
+                try {
+                    const message = JSON.parse(event.data);
+                    if (message.type === 'ping') {
+                        // The server closes sockets that stay silent past its idle timeout
+                        socket.send(JSON.stringify({ type: 'pong' }));
+                    } else if (message.type === 'xp_update') {
+                        const { user_id, username, xp: newXP } = message.data;
+                        setLeaderboard(prev => {
+                            const existing = prev.find(u => u.username === username);
+                            let updated;
+                            if (existing) {
+                                updated = prev.map(u => u.username === username ? { ...u, xp: newXP } : u);
+                            } else {
+                                updated = [...prev, { id: user_id, username, xp: newXP }];
+                            }
+                            // Sort by XP descending
+                            return updated.sort((a, b) => b.xp - a.xp).slice(0, 10);
+                        });
+                    }
+                } catch (e) {
+                    console.error("WebSocket message error", e);
                 }
-            } catch (e) {
-                console.error("WebSocket message error", e);
-            }
+            };
+
+            socket.onclose = () => {
+                if (closed) return;
+                retryTimer = setTimeout(connect, retryDelay);
+                retryDelay = Math.min(retryDelay * 2, 30000);
+            };
         };
 
+        connect();
+
         return () => {
+            closed = true;
+            clearTimeout(retryTimer);
             if (ws.current) ws.current.close();
         };
     }, []);
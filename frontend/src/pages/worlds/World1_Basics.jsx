@@ -6,7 +6,7 @@ import toast from 'react-hot-toast';
 
 export default function World1() {
     const navigate = useNavigate();
-    const { addXP, completeWorld } = useGame();
+    const { syncXP, completeWorld } = useGame();
     const [question, setQuestion] = useState(null);
     const [selected, setSelected] = useState(null);
     const [result, setResult] = useState(null);
@@ -35,12 +35,12 @@ export default function World1() {
         if (selected) return;
         setSelected(option);
         try {
-            const res = await worldsAPI.submitPatternAnswer(question.question_item, option);
-            const r = res.data;
+            const res = await worldsAPI.submitAnswers([{ world: 1, question_item: question.question_item, answer: option }]);
+            const r = res.data.results[0];
+            syncXP(res.data.total_xp);
             setResult(r);
             const newTotal = score.total + 1;
             if (r.is_correct) {
-                addXP(r.xp_earned);
                 setScore({ correct: score.correct + 1, total: newTotal });
                 setStreak(s => s + 1);
                 toast.success(`+${r.xp_earned} XP`, { icon: '⚡' });
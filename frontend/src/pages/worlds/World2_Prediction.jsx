@@ -7,7 +7,7 @@ import toast from 'react-hot-toast';
 
 export default function World2() {
     const navigate = useNavigate();
-    const { addXP, completeWorld } = useGame();
+    const { syncXP, completeWorld } = useGame();
     const [question, setQuestion] = useState(null);
     const [selected, setSelected] = useState(null);
     const [result, setResult] = useState(null);
@@ -37,15 +37,15 @@ export default function World2() {
         setSelected(word);
         setShowProbs(true);
         try {
-            const res = await worldsAPI.submitPredictionAnswer(question.prompt, word);
-            const r = res.data;
+            const res = await worldsAPI.submitAnswers([{ world: 2, question_id: question.id, prompt: question.prompt, answer: word }]);
+            const r = res.data.results[0];
+            syncXP(res.data.total_xp);
             setResult(r);
             setScore(s => ({
                 correct: s.correct + (r.is_correct ? 1 : 0),
                 total: s.total + 1,
             }));
             if (r.is_correct) {
-                addXP(r.xp_earned);
                 toast.success(`+${r.xp_earned} XP`, { icon: '⚡' });
                 if (score.total + 1 >= 3) {
                     completeWorld(2, 'prediction_pro');
@@ -7,7 +7,7 @@ import toast from 'react-hot-toast';
 
 export default function World9() {
     const navigate = useNavigate();
-    const { addXP, completeWorld } = useGame();
+    const { syncXP, completeWorld } = useGame();
     const [question, setQuestion] = useState(null);
     const [result, setResult] = useState(null);
     const [loading, setLoading] = useState(false);
@@ -31,15 +31,15 @@ export default function World9() {
     const handleAnswer = async (answer) => {
         if (result) return;
         try {
-            const res = await worldsAPI.submitHallucinationAnswer(question._id, answer);
-            const r = res.data;
+            const res = await worldsAPI.submitAnswers([{ world: 9, question_id: question._id, answer }]);
+            const r = res.data.results[0];
+            syncXP(res.data.total_xp);
             setResult(r);
             setScore(s => ({
                 correct: s.correct + (r.is_correct ? 1 : 0),
                 total: s.total + 1,
             }));
             if (r.is_correct) {
-                addXP(r.xp_earned);
                 toast.success(`+${r.xp_earned} XP!`, { icon: '🕵️' });
                 if (score.total + 1 >= 3) {
                     completeWorld(5, 'truth_seeker');
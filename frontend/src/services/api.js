@@ -39,6 +39,14 @@ export const worldsAPI = {
   getHallucinationQuestion: () => api.get('/worlds/9/question'),
   submitHallucinationAnswer: (questionId, answer) => api.post('/worlds/9/answer', { question_id: questionId, answer }),
 
+  // Worlds 1, 2, 9: grade many answers and apply XP + mistakes in one call
+  // answers: [{ world: 1, question_item, answer } | { world: 2, prompt, answer } | { world: 9, question_id, answer }]
+  submitAnswers: (answers) => api.post('/worlds/answers', { answers }),
+
+  // Prefetch n distinct questions in one call; pass the returned seed back to replay a batch
+  getQuestionBatch: (world, n, { difficulty, seed } = {}) =>
+    api.get(`/worlds/${world}/question`, { params: { n, difficulty, seed } }),
+
   // World 10: Training (formerly 6)
   world10Train: (item, category, sessionId = 'default') => api.post('/worlds/10/train', { item, category, session_id: sessionId }),
   world10Predict: (item, sessionId = 'default') => api.post('/worlds/10/predict', { item, session_id: sessionId }),